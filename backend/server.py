@@ -1,17 +1,46 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from pymongo import ASCENDING, DESCENDING, CursorType, IndexModel, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, CollectionInvalid, OperationFailure
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import argparse
+import sys
 import hashlib
+import hmac
+import base64
+import codecs
+import contextvars
+import csv
+import io
+import json
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 import os
+import re
+import math
+import random
+import heapq
+import bisect
+import unicodedata
+import time
+import threading
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, EmailStr
+from pydantic import BaseModel, Field, EmailStr, ValidationError
 from typing import List, Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import uuid
+import numpy as np
+import orjson
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -20,14 +49,233 @@ load_dotenv(ROOT_DIR / '.env')
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ADMIN_EMAILS = {e.strip().lower() for e in os.environ.get('ADMIN_EMAILS', '').split(',') if e.strip()}
 
 security = HTTPBearer()
 
+# Prometheus metrics, served from /metrics; values are per process
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status", ["method", "route", "status"]
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served by route group", ["group"])
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests rejected by admission control", ["group", "reason"]
+)
+MONGO_COMMAND_SECONDS = Histogram(
+    "mongodb_command_duration_seconds", "Mongo command latency seen by the driver",
+    ["command", "collection", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+MONGO_CHECKOUT_SECONDS = Histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+)
+MONGO_CHECKOUT_FAILURES = Counter(
+    "mongodb_pool_checkout_failures_total", "Connection checkouts that failed", ["reason"]
+)
+MONGO_CONNECTIONS_CHECKED_OUT = Gauge("mongodb_pool_connections_checked_out", "Connections currently in use")
+PRINCIPAL_LOOKUP_SECONDS = Histogram(
+    "principal_lookup_duration_seconds", "Time to resolve the authenticated user in get_current_user"
+)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per command and collection timings; the collection is only on the started event"""
+    def __init__(self):
+        self._collections = {}
+    
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+    
+    def observe(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_SECONDS.labels(event.command_name, collection, outcome).observe(event.duration_micros / 1e6)
+    
+    def succeeded(self, event):
+        self.observe(event, "success")
+    
+    def failed(self, event):
+        self.observe(event, "failure")
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Checkout waits; a checkout starts and finishes on the same driver thread"""
+    def __init__(self):
+        self._local = threading.local()
+    
+    def connection_check_out_started(self, event):
+        self._local.started_at = time.perf_counter()
+    
+    def connection_checked_out(self, event):
+        MONGO_CHECKOUT_SECONDS.observe(time.perf_counter() - getattr(self._local, "started_at", time.perf_counter()))
+        MONGO_CONNECTIONS_CHECKED_OUT.inc()
+    
+    def connection_check_out_failed(self, event):
+        MONGO_CHECKOUT_FAILURES.labels(event.reason).inc()
+    
+    def connection_checked_in(self, event):
+        MONGO_CONNECTIONS_CHECKED_OUT.dec()
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+
+# Per-request database accounting: commands, time and documents, with repeated-shape detection.
+# Motor copies the caller's context into its executor threads, so listeners see the request's stats.
+QUERY_SHAPE_REPEAT_THRESHOLD = int(os.environ.get('QUERY_SHAPE_REPEAT_THRESHOLD', '5'))
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', '25'))
+# Test mode: a request over its budget raises instead of only being logged
+QUERY_BUDGET_ENFORCED = os.environ.get('QUERY_BUDGET_ENFORCED', 'false').lower() == 'true'
+# Budgets for routes that legitimately need more round trips, keyed by route template; None is
+# unlimited. Export and import grow with the data set: every getMore and insert batch is a command.
+QUERY_BUDGETS = {
+    "/api/export/{dataset}": None,
+    "/api/admin/import": None,
+}
+
+db_logger = logging.getLogger("iqx.db")
+
+class RequestDbStats:
+    def __init__(self):
+        self.commands = 0
+        self.duration_ms = 0.0
+        self.documents = 0
+        self.shapes = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+    
+    def repeated_shapes(self) -> dict:
+        return {shape: count for shape, count in self.shapes.items() if count >= QUERY_SHAPE_REPEAT_THRESHOLD}
+
+request_db_stats = contextvars.ContextVar("request_db_stats", default=None)
+
+def value_shape(value):
+    # Keep field names and operators, drop the values they compare against
+    if isinstance(value, dict):
+        return {key: value_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+        return [value_shape(item) for item in value]
+    return "?"
+
+def command_shape(command_name: str, command) -> str:
+    target = command.get(command_name)
+    collection = target if isinstance(target, str) else command.get("collection", "")
+    if command_name == "find":
+        shape = value_shape(command.get("filter", {}))
+    elif command_name == "aggregate":
+        shape = value_shape(command.get("pipeline", []))
+    elif command_name in ("update", "delete"):
+        shape = [value_shape(op.get("q", {})) for op in command.get(command_name + "s", [])[:1]]
+    elif command_name in ("findAndModify", "count", "distinct"):
+        shape = value_shape(command.get("query", {}))
+    else:
+        shape = None
+    return f"{command_name} {collection} {json.dumps(shape, sort_keys=True, default=str)}"
+
+def reply_documents(reply) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    return 1 if reply.get("value") else 0
+
+class MongoRequestAccounting(monitoring.CommandListener):
+    def started(self, event):
+        stats = request_db_stats.get()
+        if stats is None or event.command_name in MONGO_LATENCY_IGNORED_COMMANDS - {"getMore"}:
+            return
+        shape = command_shape(event.command_name, event.command)
+        with stats._lock:
+            stats._pending[(event.connection_id, event.request_id)] = shape
+            # getMore continues an earlier query, so it is not a new shape
+            if event.command_name != "getMore":
+                stats.shapes[shape] = stats.shapes.get(shape, 0) + 1
+    
+    def finished(self, event, documents: int):
+        stats = request_db_stats.get()
+        if stats is None:
+            return
+        with stats._lock:
+            if stats._pending.pop((event.connection_id, event.request_id), None) is None:
+                return
+            stats.commands += 1
+            stats.duration_ms += event.duration_micros / 1000
+            stats.documents += documents
+    
+    def succeeded(self, event):
+        self.finished(event, reply_documents(event.reply))
+    
+    def failed(self, event):
+        self.finished(event, 0)
+
+# Mongo latency as seen by the driver, smoothed so admission control can react to overload
+MONGO_LATENCY_ALPHA = 0.2
+MONGO_LATENCY_STALE_SECONDS = 10
+# Blocking or housekeeping commands whose duration says nothing about load
+MONGO_LATENCY_IGNORED_COMMANDS = {"getMore", "hello", "isMaster", "ismaster", "ping", "endSessions"}
+
+class MongoLatencyTracker(monitoring.CommandListener):
+    def __init__(self):
+        self.ewma_ms = 0.0
+        self.updated_at = 0.0
+    
+    def observe(self, command_name: str, duration_micros: int):
+        if command_name in MONGO_LATENCY_IGNORED_COMMANDS:
+            return
+        sample = duration_micros / 1000
+        self.ewma_ms += MONGO_LATENCY_ALPHA * (sample - self.ewma_ms)
+        self.updated_at = time.monotonic()
+    
+    def latency_ms(self) -> float:
+        # With no recent commands there is no evidence of overload
+        if time.monotonic() - self.updated_at > MONGO_LATENCY_STALE_SECONDS:
+            return 0.0
+        return self.ewma_ms
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self.observe(event.command_name, event.duration_micros)
+    
+    def failed(self, event):
+        self.observe(event.command_name, event.duration_micros)
+
+mongo_latency = MongoLatencyTracker()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    event_listeners=[mongo_latency, MongoCommandMetrics(), MongoPoolMetrics(), MongoRequestAccounting()]
+)
 db = client[os.environ['DB_NAME']]
 
+# Projections applied at query time so _id and password hashes never leave Mongo
+NO_ID = {"_id": 0}
+PUBLIC_USER = {"_id": 0, "hashed_password": 0}
+PUBLIC_REVIEW = {"_id": 0, "rating_applied": 0}
+
 # Create the main app without a prefix
 app = FastAPI(title="IQX Professionals Platform")
 
@@ -42,6 +290,7 @@ class User(BaseModel):
     full_name: str
     phone: str
     location: str = "Bogotá"
+    location_point: Optional[dict] = None  # GeoJSON point resolved from location
     profile_image: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
@@ -56,10 +305,14 @@ class Professional(BaseModel):
     certifications: List[str] = []
     average_rating: float = 0.0
     total_reviews: int = 0
+    rating_sum: int = 0
+    rating_count: int = 0
     hourly_rate: Optional[float] = None
     availability_status: str = "available"  # available, busy, unavailable
     skills: List[str] = []
     areas_of_expertise: List[str] = []  # ortopedia, columna, etc.
+    location_point: Optional[dict] = None  # copied from the user for geo queries
+    location_terms: List[str] = []  # folded words of the user's location for indexed filtering
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -74,6 +327,8 @@ class Company(BaseModel):
     requirements: List[str] = []
     average_rating: float = 0.0
     total_reviews: int = 0
+    rating_sum: int = 0
+    rating_count: int = 0
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -86,6 +341,8 @@ class Supplier(BaseModel):
     certifications: List[str] = []
     average_rating: float = 0.0
     total_reviews: int = 0
+    rating_sum: int = 0
+    rating_count: int = 0
     quality_score: float = 0.0
     reliability_score: float = 0.0
     competitiveness_score: float = 0.0
@@ -149,6 +406,15 @@ class ReviewCreate(BaseModel):
     comment: str
     collaboration_type: Optional[str] = None
 
+class ReviewSummary(BaseModel):
+    user_id: str
+    count: int = 0
+    rating_sum: int = 0
+    average_rating: float = 0.0
+    histogram: dict = Field(default_factory=lambda: {str(star): 0 for star in range(1, 6)})
+    by_collaboration_type: dict = {}  # type -> {"count", "rating_sum"}
+    recent: List[dict] = []
+
 class ServiceRequest(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     professional_id: str
@@ -276,6 +542,56 @@ class MatchRequestCreate(BaseModel):
     requirements: List[str] = []
     deadline: Optional[datetime] = None
 
+class Conversation(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    company_id: str
+    professional_id: str
+    participants: List[str]  # [company_id, professional_id]
+    message_count: int = 0  # also the sequence number of the latest message
+    unread: dict = {"company": 0, "professional": 0}  # unread message count per side
+    last_message: Optional[str] = None  # preview of the latest message
+    last_message_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class ConversationCreate(BaseModel):
+    participant_id: str  # the professional or company to talk to
+
+class Message(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    conversation_id: str
+    seq: int  # position in the conversation, starting at 1
+    sender_id: str
+    body: str
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class MessageCreate(BaseModel):
+    body: str = Field(min_length=1, max_length=5000)
+
+class Notification(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    type: str  # service_request.created, service_request.approved, payment.released, dispute.created
+    title: str
+    body: str = ""
+    data: dict = {}
+    read: bool = False
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: Optional[datetime] = None  # set once read; the TTL index removes it afterwards
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str
+    payload: dict = {}
+    status: str = "queued"  # queued, running, done, dead
+    attempts: int = 0
+    run_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    expires_at: Optional[datetime] = None  # set once done; the TTL index removes it afterwards
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -290,16 +606,60 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+# Password hashing: PBKDF2-SHA256 with a per-password salt, run on a bounded worker pool
+PASSWORD_HASH_ALGORITHM = "pbkdf2_sha256"
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', '310000'))
+
+password_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', '4')),
+    thread_name_prefix="password-hash"
+)
+
 # Helper functions
 def verify_password(plain_password, hashed_password):
-    # Simple SHA256 hashing with salt
+    if hashed_password.startswith(PASSWORD_HASH_ALGORITHM + "$"):
+        _, iterations, salt, expected = hashed_password.split("$")
+        digest = hashlib.pbkdf2_hmac(
+            "sha256", plain_password.encode(), base64.b64decode(salt), int(iterations)
+        )
+        return hmac.compare_digest(base64.b64encode(digest).decode(), expected)
+    
+    # Legacy hashes: single SHA256 pass salted with SECRET_KEY
     salted_password = plain_password + SECRET_KEY
-    return hashlib.sha256(salted_password.encode()).hexdigest() == hashed_password
+    return hmac.compare_digest(hashlib.sha256(salted_password.encode()).hexdigest(), hashed_password)
 
 def get_password_hash(password):
-    # Simple SHA256 hashing with salt
-    salted_password = password + SECRET_KEY
-    return hashlib.sha256(salted_password.encode()).hexdigest()
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+    return "$".join([
+        PASSWORD_HASH_ALGORITHM,
+        str(PASSWORD_HASH_ITERATIONS),
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode()
+    ])
+
+# Verified in place of a missing user's hash so unknown emails cost the same PBKDF2 run as known ones;
+# the random digest never matches any password
+DUMMY_PASSWORD_HASH = "$".join([
+    PASSWORD_HASH_ALGORITHM,
+    str(PASSWORD_HASH_ITERATIONS),
+    base64.b64encode(os.urandom(16)).decode(),
+    base64.b64encode(os.urandom(32)).decode()
+])
+
+def password_needs_rehash(hashed_password) -> bool:
+    if not hashed_password.startswith(PASSWORD_HASH_ALGORITHM + "$"):
+        return True
+    return int(hashed_password.split("$")[1]) < PASSWORD_HASH_ITERATIONS
+
+# Hashing is CPU bound; hashlib releases the GIL so the pool keeps the event loop responsive
+async def hash_password_async(password) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_pool, get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_pool, verify_password, plain_password, hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -311,62 +671,1400 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    credentials_exception = HTTPException(
+# Bounded in-process cache with per-entry expiry and least-recently-used eviction
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+    
+    def clear(self):
+        self._entries.clear()
+    
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Authenticated users keyed by token subject (email)
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', '10000')),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL_SECONDS', '60'))
+)
+
+# Every worker caches principals; a user write drops the entry here and, through the event hub, on
+# every other worker. A None email (bulk maintenance) clears the whole cache.
+def apply_principal_invalidation(data: dict):
+    if data["email"] is None:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate(data["email"])
+
+async def invalidate_principal(email: Optional[str]):
+    data = {"email": email}
+    apply_principal_invalidation(data)
+    await publish_event([], "principal.invalidated", data)
+
+# Caches reported on /metrics
+CACHES = {"principal": principal_cache}
+
+class CacheCollector:
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found a live entry", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that missed or found an expired entry", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries currently held", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits over lookups since start", labels=["cache"])
+        for name, cache in CACHES.items():
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["size"])
+            ratio.add_metric([name], stats["hits"] / lookups if lookups else 0.0)
+        return [hits, misses, size, ratio]
+
+REGISTRY.register(CacheCollector())
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token_subject(token: str) -> str:
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise credentials_exception()
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
+    return email
+
+async def get_token_subject(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    return decode_token_subject(credentials.credentials)
+
+async def load_principal(email: str) -> User:
+    cached_user = principal_cache.get(email)
+    if cached_user is not None:
+        return cached_user
     
-    user = await db.users.find_one({"email": email})
+    user = await db.users.find_one({"email": email}, PUBLIC_USER)
     if user is None:
-        raise credentials_exception
-    
-    # Remove hashed_password from response
-    user_data = user.copy()
-    del user_data["hashed_password"]
-    return User(**user_data)
-
-# Calculate average rating for a user
-async def update_user_ratings(user_id: str):
-    reviews = await db.reviews.find({"reviewed_user_id": user_id}).to_list(1000)
-    if reviews:
-        total_rating = sum(review["rating"] for review in reviews)
-        average_rating = total_rating / len(reviews)
-        
-        # Update in professionals collection if it's a professional
-        await db.professionals.update_one(
-            {"user_id": user_id},
+        raise credentials_exception()
+    
+    current_user = User(**user)
+    principal_cache.set(email, current_user)
+    return current_user
+
+async def get_current_user(email: str = Depends(get_token_subject)):
+    started_at = time.perf_counter()
+    try:
+        return await load_principal(email)
+    finally:
+        PRINCIPAL_LOOKUP_SECONDS.observe(time.perf_counter() - started_at)
+
+async def get_admin_user(current_user: User = Depends(get_current_user)):
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return current_user
+
+# Per-collection version counters bumped by every write path, used for conditional GETs.
+# The counters live in Mongo so every worker and maintenance command shares them. Each worker
+# answers from an in-memory copy: bumps are broadcast through the event hub, and a refresh loop
+# reloads the copy so a missed broadcast (or the local event backend) is stale for seconds at most.
+CACHE_CONTROL = "no-cache"
+VERSION_REFRESH_SECONDS = float(os.environ.get('VERSION_REFRESH_SECONDS', '5'))
+VERSION_EPOCH_ID = "__epoch__"
+collection_versions = {}
+version_state = {"epoch": "0"}  # changes if the counters are wiped, so old ETags never match again
+version_refresh_task = None
+
+async def bump_version(*collections: str):
+    for collection in collections:
+        counter = await db.collection_versions.find_one_and_update(
+            {"_id": collection},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        collection_versions[collection] = max(collection_versions.get(collection, 0), counter["version"])
+    await publish_event([], "collection.versions", {c: collection_versions[c] for c in collections})
+
+def apply_collection_versions(versions: dict):
+    # Broadcasts can arrive out of order; versions only move forward
+    for collection, version in versions.items():
+        collection_versions[collection] = max(collection_versions.get(collection, 0), version)
+
+async def load_collection_versions():
+    """Replace the in-memory copy with the shared counters"""
+    epoch = await db.collection_versions.find_one_and_update(
+        {"_id": VERSION_EPOCH_ID},
+        {"$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    versions = {
+        counter["_id"]: counter["version"]
+        async for counter in db.collection_versions.find({"_id": {"$ne": VERSION_EPOCH_ID}})
+    }
+    # Refill the ring buffer before its counter moves, so the reviews ETag never runs ahead of it
+    if versions.get("reviews", 0) != recent_reviews_state["version"]:
+        await load_recent_reviews(versions.get("reviews", 0))
+    version_state["epoch"] = epoch["epoch"]
+    collection_versions.clear()
+    collection_versions.update(versions)
+
+async def version_refresh_loop():
+    while True:
+        await asyncio.sleep(VERSION_REFRESH_SECONDS)
+        try:
+            await load_collection_versions()
+        except Exception:
+            logger.exception("Could not refresh collection versions")
+
+def collection_etag(*collections: str) -> str:
+    versions = "-".join(str(collection_versions.get(collection, 0)) for collection in collections)
+    return f'"{version_state["epoch"]}-{versions}"'
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """304 response when the client's If-None-Match already holds etag"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    return None
+
+def cacheable_response(content, etag: str, headers: Optional[dict] = None) -> ORJSONResponse:
+    return ORJSONResponse(content, headers={**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+# Profile collection for each user type
+PROFILE_COLLECTIONS = {
+    "professional": "professionals",
+    "company": "companies",
+    "supplier": "suppliers",
+}
+
+# Profile repository: a user and their typed profile in one round trip
+PROFILE_LOOKUP_STAGES = [
+    {"$lookup": {
+        "from": collection,
+        "localField": "id",
+        "foreignField": "user_id",
+        "as": collection
+    }}
+    for collection in PROFILE_COLLECTIONS.values()
+] + [{"$project": {f"{collection}._id": 0 for collection in PROFILE_COLLECTIONS.values()}}]
+
+async def find_user_with_profile(query: dict, projection: dict = PUBLIC_USER):
+    """Return (user, profile) for the first user matching query, or (None, None)"""
+    pipeline = [{"$match": query}, {"$limit": 1}, {"$project": projection}] + PROFILE_LOOKUP_STAGES
+    users = await db.users.aggregate(pipeline).to_list(1)
+    if not users:
+        return None, None
+    
+    user = users[0]
+    profiles = {collection: user.pop(collection) for collection in PROFILE_COLLECTIONS.values()}
+    matches = profiles.get(PROFILE_COLLECTIONS.get(user["user_type"]), [])
+    return user, matches[0] if matches else None
+
+async def find_profile(user_id: str, user_type: str) -> Optional[dict]:
+    collection = PROFILE_COLLECTIONS.get(user_type)
+    if not collection:
+        return None
+    return await db[collection].find_one({"user_id": user_id}, NO_ID)
+
+def merge_profile(user: dict, profile: Optional[dict]) -> dict:
+    # Profile fields take precedence over user fields
+    return {**user, **profile} if profile else user
+
+async def get_current_user_with_profile(email: str = Depends(get_token_subject)) -> dict:
+    """Current user merged with their typed profile in a single round trip"""
+    cached_user = principal_cache.get(email)
+    if cached_user is not None:
+        profile = await find_profile(cached_user.id, cached_user.user_type)
+        return merge_profile(cached_user.dict(), profile)
+    
+    user, profile = await find_user_with_profile({"email": email})
+    if user is None:
+        raise credentials_exception()
+    
+    current_user = User(**user)
+    principal_cache.set(email, current_user)
+    return merge_profile(current_user.dict(), profile)
+
+# Background jobs: durable queue in Mongo so handlers can hand off side effects and return.
+# Delivery is at least once: a job whose lease expires (worker crash, restart) runs again,
+# so every handler must be idempotent.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '4'))
+JOB_VISIBILITY_TIMEOUT_SECONDS = int(os.environ.get('JOB_VISIBILITY_TIMEOUT_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_SECONDS = 2
+JOB_MAX_BACKOFF_SECONDS = 600
+JOB_POLL_INTERVAL_SECONDS = 1.0
+JOB_DONE_RETENTION_HOURS = 24
+
+job_handlers = {}
+job_tasks = []
+job_wakeup = asyncio.Event()
+
+def job_handler(job_type: str):
+    def register(handler):
+        job_handlers[job_type] = handler
+        return handler
+    return register
+
+async def enqueue_job(job_type: str, payload: dict, session=None) -> str:
+    job = Job(type=job_type, payload=jsonable_encoder(payload))
+    await db.jobs.insert_one(job.dict(), session=session)
+    job_wakeup.set()
+    return job.id
+
+async def claim_job() -> Optional[dict]:
+    """Lease the next due job, reclaiming ones whose worker stopped before finishing"""
+    now = datetime.now(timezone.utc)
+    lease = {
+        "$set": {"status": "running", "locked_until": now + timedelta(seconds=JOB_VISIBILITY_TIMEOUT_SECONDS), "updated_at": now},
+        "$inc": {"attempts": 1}
+    }
+    job = await db.jobs.find_one_and_update(
+        {"status": "queued", "run_at": {"$lte": now}}, lease,
+        projection=NO_ID, sort=[("run_at", ASCENDING)], return_document=ReturnDocument.AFTER
+    )
+    if job:
+        return job
+    
+    # A lease that lapsed on the last attempt means the job keeps killing its worker; stop retrying it
+    expired = {"status": "running", "locked_until": {"$lte": now}}
+    dead = await db.jobs.update_many(
+        {**expired, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+        {"$set": {"status": "dead", "locked_until": None, "last_error": "Lease expired on the final attempt", "updated_at": now}}
+    )
+    if dead.modified_count:
+        logger.error("Dead-lettered %d jobs whose lease expired on the final attempt", dead.modified_count)
+    return await db.jobs.find_one_and_update(
+        {**expired, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}, lease,
+        projection=NO_ID, sort=[("locked_until", ASCENDING)], return_document=ReturnDocument.AFTER
+    )
+
+def job_backoff(attempts: int) -> float:
+    return min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_MAX_BACKOFF_SECONDS)
+
+async def run_job(job: dict):
+    # Matching on attempts keeps a worker whose lease was taken over from overwriting the new run
+    owned = {"id": job["id"], "attempts": job["attempts"]}
+    now = datetime.now(timezone.utc)
+    try:
+        handler = job_handlers[job["type"]]
+        await asyncio.wait_for(handler(**job["payload"]), JOB_VISIBILITY_TIMEOUT_SECONDS)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if job["attempts"] >= JOB_MAX_ATTEMPTS or job["type"] not in job_handlers:
+            logger.error("Job %s (%s) dead-lettered after %d attempts: %s", job["id"], job["type"], job["attempts"], error)
+            changes = {"status": "dead", "locked_until": None}
+        else:
+            logger.warning("Job %s (%s) failed, retrying: %s", job["id"], job["type"], error)
+            changes = {"status": "queued", "locked_until": None, "run_at": now + timedelta(seconds=job_backoff(job["attempts"]))}
+        await db.jobs.update_one(owned, {"$set": {**changes, "last_error": error, "updated_at": now}})
+        return
+    
+    await db.jobs.update_one(owned, {"$set": {
+        "status": "done",
+        "locked_until": None,
+        "updated_at": now,
+        "expires_at": now + timedelta(hours=JOB_DONE_RETENTION_HOURS)
+    }})
+
+async def job_worker():
+    while True:
+        try:
+            job = await claim_job()
+        except Exception:
+            logger.exception("Could not claim a job")
+            job = None
+        if job is None:
+            # Sleep until something is enqueued here, or poll for retries and other processes' jobs
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            job_wakeup.clear()
+            continue
+        try:
+            await run_job(job)
+        except Exception:
+            logger.exception("Could not record the outcome of job %s", job["id"])
+
+def start_job_workers():
+    job_tasks.extend(asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS))
+
+async def stop_job_workers():
+    # Interrupted jobs stay leased and are picked up again once their visibility timeout lapses
+    for task in job_tasks:
+        task.cancel()
+    await asyncio.gather(*job_tasks, return_exceptions=True)
+    job_tasks.clear()
+
+async def requeue_dead_jobs() -> int:
+    result = await db.jobs.update_many(
+        {"status": "dead"},
+        {"$set": {"status": "queued", "attempts": 0, "run_at": datetime.now(timezone.utc)}}
+    )
+    return result.modified_count
+
+# Fold a new review into the user's running rating totals
+async def update_user_ratings(user_id: str, user_type: str, rating: int, session=None) -> Optional[dict]:
+    """Returns the profile's new average_rating; the caller bumps the version once it is committed"""
+    collection = PROFILE_COLLECTIONS.get(user_type)
+    if not collection:
+        return
+    
+    # Single atomic pipeline update: increment the totals, then derive the average from them
+    profile = await db[collection].find_one_and_update(
+        {"user_id": user_id},
+        [
+            {"$set": {
+                "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, rating]},
+                "rating_count": {"$add": [{"$ifNull": ["$rating_count", 0]}, 1]}
+            }},
             {"$set": {
-                "average_rating": round(average_rating, 1),
-                "total_reviews": len(reviews)
+                "average_rating": {"$round": [{"$divide": ["$rating_sum", "$rating_count"]}, 1]},
+                "total_reviews": "$rating_count"
             }}
+        ],
+        projection={"average_rating": 1},
+        return_document=ReturnDocument.AFTER,
+        session=session
+    )
+    return profile
+
+@job_handler("apply_review_rating")
+async def apply_review_rating(review_id: str, user_id: str, user_type: str, rating: int):
+    async def apply(session):
+        # Flag the review first so a retried job never counts it twice; without transactions a
+        # crash between the two writes drops the rating until reconcile-ratings runs
+        claimed = await db.reviews.update_one(
+            {"id": review_id, "rating_applied": {"$ne": True}}, {"$set": {"rating_applied": True}}, session=session
         )
-        
-        # Also update companies and suppliers
-        await db.companies.update_one(
-            {"user_id": user_id},
+        if claimed.modified_count:
+            return await update_user_ratings(user_id, user_type, rating, session)
+        return None
+    
+    profile = await run_in_transaction(apply)
+    # Only after the commit: a poll in between would cache the old rating under the new ETag
+    if profile is not None:
+        await bump_version(PROFILE_COLLECTIONS[user_type])
+        if user_type == "professional":
+            await index_professional_rating(user_id, profile["average_rating"])
+
+# Recompute every user's rating totals from the reviews collection
+async def reconcile_user_ratings():
+    # Flag and total the same snapshot: rating jobs for these reviews must not add them again,
+    # and reviews written after it are left to their own jobs
+    snapshot = {"created_at": {"$lte": datetime.now(timezone.utc)}}
+    await db.reviews.update_many({**snapshot, "rating_applied": {"$ne": True}}, {"$set": {"rating_applied": True}})
+    totals = db.reviews.aggregate([
+        {"$match": snapshot},
+        {"$group": {
+            "_id": "$reviewed_user_id",
+            "rating_sum": {"$sum": "$rating"},
+            "rating_count": {"$sum": 1}
+        }},
+        {"$lookup": {
+            "from": "users",
+            "localField": "_id",
+            "foreignField": "id",
+            "as": "user"
+        }},
+        {"$unwind": "$user"},
+        {"$project": {"rating_sum": 1, "rating_count": 1, "user_type": "$user.user_type"}}
+    ])
+    
+    updates = {collection: [] for collection in PROFILE_COLLECTIONS.values()}
+    async for total in totals:
+        collection = PROFILE_COLLECTIONS.get(total["user_type"])
+        if not collection:
+            continue
+        updates[collection].append(UpdateOne(
+            {"user_id": total["_id"]},
             {"$set": {
-                "average_rating": round(average_rating, 1),
-                "total_reviews": len(reviews)
+                "rating_sum": total["rating_sum"],
+                "rating_count": total["rating_count"],
+                "average_rating": round(total["rating_sum"] / total["rating_count"], 1),
+                "total_reviews": total["rating_count"]
             }}
+        ))
+    
+    for collection, operations in updates.items():
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+        # Profiles that were never reviewed start from zero
+        await db[collection].update_many(
+            {"rating_count": {"$exists": False}},
+            {"$set": {"rating_sum": 0, "rating_count": 0}}
         )
+    await bump_version(*updates)
+    # Every rating changed at once; workers rebuild their match engines rather than patch them
+    await publish_event([], "professionals.rebuild", {})
+
+# Review summaries: per-user aggregates maintained on write, plus a global recent-reviews ring buffer
+REVIEW_SUMMARY_RECENT = 10
+RECENT_REVIEWS_SIZE = 100
+recent_reviews = deque(maxlen=RECENT_REVIEWS_SIZE)
+recent_reviews_state = {"version": None}  # reviews counter the buffer was last loaded at
+
+def collaboration_key(collaboration_type: Optional[str]) -> str:
+    # Used as a field name, so dots and a leading $ are not allowed
+    return (collaboration_type or "unspecified").replace(".", "_").lstrip("$") or "unspecified"
+
+async def record_review_summary(review: dict):
+    """Fold one review into the reviewed user's summary with a single upsert"""
+    key = collaboration_key(review.get("collaboration_type"))
+    await db.review_summaries.update_one(
+        {"user_id": review["reviewed_user_id"]},
+        {
+            "$inc": {
+                "count": 1,
+                "rating_sum": review["rating"],
+                f"histogram.{review['rating']}": 1,
+                f"by_collaboration_type.{key}.count": 1,
+                f"by_collaboration_type.{key}.rating_sum": review["rating"],
+            },
+            "$push": {"recent": {"$each": [review], "$position": 0, "$slice": REVIEW_SUMMARY_RECENT}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        upsert=True
+    )
+
+async def get_review_summary(user_id: str) -> dict:
+    summary = await db.review_summaries.find_one({"user_id": user_id}, NO_ID)
+    summary = ReviewSummary(**(summary or {"user_id": user_id}))
+    # Stars missing from an upserted histogram still show as zero
+    summary.histogram = {**ReviewSummary(user_id=user_id).histogram, **summary.histogram}
+    if summary.count:
+        summary.average_rating = round(summary.rating_sum / summary.count, 1)
+    return summary.dict()
+
+def replace_review_summary(summary: dict, started_at: datetime) -> UpdateOne:
+    # Summaries stay readable during a rebuild, and one that a new review has updated since the
+    # rebuild began is kept: overwriting it would drop that review's $inc
+    return UpdateOne(
+        {"user_id": summary["user_id"]},
+        [{"$replaceWith": {"$cond": [
+            {"$gt": ["$updated_at", started_at]},
+            "$$ROOT",
+            {"$literal": {**summary, "updated_at": started_at}}
+        ]}}],
+        upsert=True
+    )
+
+async def rebuild_review_summaries(batch_size: int = 500):
+    """Recompute every summary in one pass over reviews grouped by reviewed user"""
+    started_at = datetime.now(timezone.utc)
+    operations = []
+    summary = None
+    cursor = db.reviews.find({}, PUBLIC_REVIEW).sort([("reviewed_user_id", 1), ("created_at", -1)])
+    async for review in cursor.batch_size(batch_size):
+        if summary is None or summary["user_id"] != review["reviewed_user_id"]:
+            if summary:
+                operations.append(replace_review_summary(summary, started_at))
+            summary = ReviewSummary(user_id=review["reviewed_user_id"]).dict()
+            del summary["average_rating"]
+        key = collaboration_key(review.get("collaboration_type"))
+        breakdown = summary["by_collaboration_type"].setdefault(key, {"count": 0, "rating_sum": 0})
+        breakdown["count"] += 1
+        breakdown["rating_sum"] += review["rating"]
+        summary["histogram"][str(review["rating"])] += 1
+        summary["count"] += 1
+        summary["rating_sum"] += review["rating"]
+        if len(summary["recent"]) < REVIEW_SUMMARY_RECENT:
+            summary["recent"].append(review)
+        if len(operations) >= batch_size:
+            await db.review_summaries.bulk_write(operations, ordered=False)
+            operations = []
+    if summary:
+        operations.append(replace_review_summary(summary, started_at))
+    if operations:
+        await db.review_summaries.bulk_write(operations, ordered=False)
+    await bump_version("reviews")
+
+async def load_recent_reviews(version: Optional[int] = None):
+    # Reloaded whenever the shared reviews counter moves; review.created events fill the gap in between
+    reviews = await db.reviews.find({}, PUBLIC_REVIEW).sort("created_at", -1).to_list(RECENT_REVIEWS_SIZE)
+    recent_reviews.clear()
+    recent_reviews.extend(reviews)
+    recent_reviews_state["version"] = version
+
+def add_recent_review(review: dict):
+    # The writing worker adds its review directly and sees it again when the event comes back
+    if all(existing["id"] != review["id"] for existing in recent_reviews):
+        recent_reviews.appendleft(review)
+
+# Full-text search over professionals
+SEARCH_FIELDS = ["full_name", "location", "specialties", "skills", "areas_of_expertise", "bio", "education"]
+
+def fold_text(text: str) -> str:
+    # Case and accent folding so "traumatologia" matches "Traumatología"
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"\w+", fold_text(text))
+
+def location_terms(location: Optional[str]) -> List[str]:
+    return sorted(set(tokenize(location or "")))
+
+class SearchIndex:
+    """In-memory inverted index with prefix matching and BM25 ranking"""
+    
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}
+        self.doc_terms = {}
+        self.total_length = 0
+        self.sorted_terms = []
+    
+    def _document_tokens(self, document: dict) -> List[str]:
+        tokens = []
+        for field in SEARCH_FIELDS:
+            value = document.get(field)
+            if isinstance(value, list):
+                value = " ".join(str(v) for v in value)
+            if value:
+                tokens.extend(tokenize(str(value)))
+        return tokens
+    
+    def remove(self, doc_id: str):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self.postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self.postings[term]
+                del self.sorted_terms[bisect.bisect_left(self.sorted_terms, term)]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+    
+    def update(self, doc_id: str, document: dict):
+        self.remove(doc_id)
+        tokens = self._document_tokens(document)
+        frequencies = {}
+        for token in tokens:
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for term, frequency in frequencies.items():
+            if term not in self.postings:
+                self.postings[term] = {}
+                bisect.insort(self.sorted_terms, term)
+            self.postings[term][doc_id] = frequency
+        self.doc_terms[doc_id] = list(frequencies)
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+    
+    def _expand(self, token: str) -> List[str]:
+        start = bisect.bisect_left(self.sorted_terms, token)
+        terms = []
+        for term in self.sorted_terms[start:]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+    
+    def search(self, query: str, limit: int = 20) -> List[tuple]:
+        doc_count = len(self.doc_lengths)
+        if not doc_count:
+            return []
+        average_length = self.total_length / doc_count or 1
+        scores = {}
+        for token in set(tokenize(query)):
+            # Each query token scores once per document, via its best exact or prefix match
+            token_scores = {}
+            for term in self._expand(token):
+                postings = self.postings[term]
+                idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                weight = 1.0 if term == token else 0.8
+                for doc_id, frequency in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                    score = weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+                    if score > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = score
+            for doc_id, score in token_scores.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+# Professionals keyed by user_id
+search_index = SearchIndex()
+
+# Vectorized matching of professionals against match requests
+AVAILABILITY_SCORES = {"available": 1.0, "busy": 0.4, "unavailable": 0.0}
+URGENCY_AVAILABILITY_WEIGHTS = {"low": 0.05, "medium": 0.1, "high": 0.2}
+
+def parse_budget(budget_range: Optional[str]) -> Optional[float]:
+    # "150000", "100000-200000" or "hasta 200.000" -> upper bound of the range
+    if not budget_range:
+        return None
+    amounts = [float(a) for a in re.findall(r"\d+", budget_range.replace(".", "").replace(",", ""))]
+    return max(amounts) if amounts else None
+
+class MatchEngine:
+    """Array-backed professional features scored in batch with NumPy"""
+    
+    def __init__(self, capacity: int = 1024):
+        self.user_ids = []
+        self.rows = {}
+        self.rating = np.zeros(capacity, dtype=np.float32)
+        self.experience = np.zeros(capacity, dtype=np.float32)
+        self.hourly_rate = np.full(capacity, np.nan, dtype=np.float32)
+        self.availability = np.zeros(capacity, dtype=np.float32)
+        self.term_rows = {}  # folded term -> set of rows
+        self.row_terms = {}
+    
+    def _grow(self):
+        capacity = len(self.rating) * 2
+        for name, fill in (("rating", 0), ("experience", 0), ("hourly_rate", np.nan), ("availability", 0)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=np.float32)
+            new[:len(old)] = old
+            setattr(self, name, new)
+    
+    def _row(self, user_id: str) -> int:
+        row = self.rows.get(user_id)
+        if row is None:
+            row = len(self.user_ids)
+            if row == len(self.rating):
+                self._grow()
+            self.user_ids.append(user_id)
+            self.rows[user_id] = row
+        return row
+    
+    def update(self, user_id: str, professional: dict):
+        row = self._row(user_id)
+        self.rating[row] = professional.get("average_rating") or 0.0
+        self.experience[row] = professional.get("experience_years") or 0
+        rate = professional.get("hourly_rate")
+        self.hourly_rate[row] = np.nan if rate is None else rate
+        self.availability[row] = AVAILABILITY_SCORES.get(professional.get("availability_status", "available"), 0.0)
         
-        await db.suppliers.update_one(
-            {"user_id": user_id},
-            {"$set": {
-                "average_rating": round(average_rating, 1),
-                "total_reviews": len(reviews)
-            }}
+        terms = {"loc:" + t for t in tokenize(professional.get("location", ""))}
+        for specialty in professional.get("specialties", []):
+            terms.add("spec:" + fold_text(specialty))
+        for field in ("specialties", "skills", "areas_of_expertise"):
+            for value in professional.get(field, []):
+                terms.update(tokenize(value))
+        for term in self.row_terms.get(row, ()):
+            self.term_rows[term].discard(row)
+        for term in terms:
+            self.term_rows.setdefault(term, set()).add(row)
+        self.row_terms[row] = terms
+    
+    def update_rating(self, user_id: str, average_rating: float):
+        row = self.rows.get(user_id)
+        if row is not None:
+            self.rating[row] = average_rating
+    
+    def _term_coverage(self, terms: set, size: int) -> np.ndarray:
+        # Fraction of the requested terms each professional covers
+        coverage = np.zeros(size, dtype=np.float32)
+        for term in terms:
+            rows = self.term_rows.get(term)
+            if rows:
+                coverage[np.fromiter(rows, dtype=np.int64, count=len(rows))] += 1
+        return coverage / max(len(terms), 1)
+    
+    def rank(self, request: MatchRequestCreate, top_k: int = 10) -> List[tuple]:
+        size = len(self.user_ids)
+        if not size:
+            return []
+        
+        wanted = set(tokenize(" ".join([request.specialty_needed, request.procedure_type, *request.requirements])))
+        skill = self._term_coverage(wanted, size)
+        specialty = self._term_coverage({"spec:" + fold_text(request.specialty_needed)}, size)
+        location = self._term_coverage({"loc:" + t for t in tokenize(request.location)}, size)
+        rating = self.rating[:size] / 5.0
+        experience = np.minimum(self.experience[:size], 20.0) / 20.0
+        
+        # Within budget scores 1, above budget decays with the overshoot, unknown rates score 0.5
+        rates = self.hourly_rate[:size]
+        budget = parse_budget(request.budget_range)
+        if budget is None:
+            affordability = np.full(size, 0.5, dtype=np.float32)
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                affordability = np.where(rates <= budget, 1.0, budget / rates)
+            affordability = np.where(np.isnan(rates), 0.5, affordability)
+        
+        availability_weight = URGENCY_AVAILABILITY_WEIGHTS.get(request.urgency_level, 0.1)
+        scores = (
+            0.25 * specialty
+            + 0.25 * skill
+            + 0.15 * rating
+            + 0.1 * experience
+            + 0.1 * affordability
+            + 0.05 * location
+            + availability_weight * self.availability[:size]
+        )
+        # Professionals who are unavailable are never suggested
+        scores = np.where(self.availability[:size] > 0, scores, -1.0)
+        
+        top_k = min(top_k, size)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.user_ids[row], float(scores[row])) for row in top if scores[row] >= 0]
+
+match_engine = MatchEngine()
+
+# Offline gazetteer of Colombian cities and Bogotá localities
+def load_gazetteer() -> dict:
+    with open(ROOT_DIR / "gazetteer_co.json", encoding="utf-8") as f:
+        places = json.load(f)
+    return {
+        " ".join(tokenize(name)): place
+        for place in places
+        for name in [place["name"], *place.get("aliases", [])]
+    }
+
+GAZETTEER = load_gazetteer()
+
+def geocode_location(text: Optional[str]) -> Optional[dict]:
+    """Resolve free-text location to a GeoJSON point, preferring the most specific place"""
+    padded = " " + " ".join(tokenize(text or "")) + " "
+    best = None
+    for name, place in GAZETTEER.items():
+        if f" {name} " in padded:
+            rank = ("city" in place, len(name))
+            if best is None or rank > best[0]:
+                best = (rank, place)
+    if best is None:
+        return None
+    return {"type": "Point", "coordinates": best[1]["coordinates"]}
+
+def resolve_near(near: str) -> dict:
+    # "lat,lon" coordinates or a place name from the gazetteer
+    parts = near.split(",")
+    if len(parts) == 2:
+        try:
+            lat, lon = float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+        else:
+            if -90 <= lat <= 90 and -180 <= lon <= 180:
+                return {"type": "Point", "coordinates": [lon, lat]}
+            raise HTTPException(status_code=400, detail="Coordinates out of range")
+    point = geocode_location(near)
+    if point is None:
+        raise HTTPException(status_code=400, detail="Unknown location")
+    return point
+
+async def backfill_location_points(batch_size: int = 1000):
+    """Geocode every user's location and copy the point and folded terms onto professional profiles"""
+    user_updates = []
+    profile_updates = []
+    
+    async def flush():
+        if user_updates:
+            await db.users.bulk_write(user_updates, ordered=False)
+        if profile_updates:
+            await db.professionals.bulk_write(profile_updates, ordered=False)
+        user_updates.clear()
+        profile_updates.clear()
+    
+    cursor = db.users.find({}, {"id": 1, "location": 1, "user_type": 1}).batch_size(batch_size)
+    async for user in cursor:
+        point = geocode_location(user.get("location"))
+        user_updates.append(UpdateOne({"id": user["id"]}, {"$set": {"location_point": point}}))
+        if user.get("user_type") == "professional":
+            profile_updates.append(UpdateOne({"user_id": user["id"]}, {"$set": {
+                "location_point": point,
+                "location_terms": location_terms(user.get("location"))
+            }}))
+        if len(user_updates) >= batch_size:
+            await flush()
+    await flush()
+    await bump_version("users", "professionals")
+    await invalidate_principal(None)
+
+async def rebuild_professional_indexes():
+    """Build the search index and match engine from one pass over the directory"""
+    index = SearchIndex()
+    engine = MatchEngine()
+    pipeline = USER_JOIN_STAGES + MERGE_USER_STAGES
+    async for professional in db.professionals.aggregate(pipeline):
+        index.update(professional["user_id"], professional)
+        engine.update(professional["user_id"], professional)
+    global search_index, match_engine
+    search_index = index
+    match_engine = engine
+    logger.info("Professional indexes built with %d professionals", len(engine.user_ids))
+
+# Every worker holds its own index and engine. The writing worker applies a change directly, then
+# every worker (itself included, harmlessly) applies it again from the event hub.
+def apply_professional_updates(data: dict):
+    for professional in data["professionals"]:
+        search_index.update(professional["user_id"], professional)
+        match_engine.update(professional["user_id"], professional)
+
+def apply_professional_rating(data: dict):
+    match_engine.update_rating(data["user_id"], data["average_rating"])
+
+async def index_professionals(professionals: List[dict]):
+    """Propagate new or edited directory entries (each carrying user_id) to every worker"""
+    data = {"professionals": professionals}
+    apply_professional_updates(data)
+    await publish_event([], "professionals.updated", data)
+
+async def index_professional_rating(user_id: str, average_rating: float):
+    data = {"user_id": user_id, "average_rating": average_rating}
+    apply_professional_rating(data)
+    await publish_event([], "professional.rated", data)
+
+rebuild_tasks = set()
+
+def schedule_professional_rebuild(data: dict):
+    task = asyncio.create_task(rebuild_professional_indexes())
+    rebuild_tasks.add(task)
+    task.add_done_callback(rebuild_tasks.discard)
+
+# Workflow state machine: legal status transitions for each workflow entity, and the only source
+# of status preconditions for them. Payments are created completed (simulated checkout), released
+# when the company confirms the service, and held by a dispute; disputes are not resolved yet, so
+# nothing leaves in_dispute.
+TRANSITIONS = {
+    "service_request": {"pending": {"approved", "rejected"}},
+    "payment": {
+        "completed": {"released", "in_dispute"},
+        "released": {"in_dispute"},
+    },
+}
+
+# Set at startup: multi-document transactions need a replica set or sharded cluster
+transactions_supported = False
+
+def status_precondition(entity: str, target: str) -> dict:
+    """Filter matching documents whose current status may move to target"""
+    sources = [source for source, targets in TRANSITIONS[entity].items() if target in targets]
+    return {"status": {"$in": sources}}
+
+async def apply_transition(collection: str, query: dict, precondition: dict, changes: dict,
+                           projection: dict = NO_ID, session=None,
+                           return_document: ReturnDocument = ReturnDocument.AFTER) -> Optional[dict]:
+    """Apply changes in one round trip if the precondition holds; returns the document or None"""
+    return await db[collection].find_one_and_update(
+        {**query, **precondition},
+        {"$set": {**changes, "updated_at": datetime.now(timezone.utc)}},
+        projection=projection,
+        return_document=return_document,
+        session=session
+    )
+
+async def transition_failure(collection: str, query: dict, not_found: str, conflict: str) -> HTTPException:
+    # Only the failure path pays for a read, to tell a missing document from a conflict
+    existing = await db[collection].find_one(query, {"status": 1})
+    if not existing:
+        return HTTPException(status_code=404, detail=not_found)
+    return HTTPException(status_code=409, detail=f"{conflict} (current status: {existing.get('status')})")
+
+async def run_in_transaction(operation):
+    """Run operation(session) in a transaction when the deployment supports it"""
+    if not transactions_supported:
+        return await operation(None)
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            return await operation(session)
+
+async def detect_transaction_support():
+    global transactions_supported
+    hello = await client.admin.command("hello")
+    transactions_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+
+# Payment ledger: append-only payment events with running balances per professional and company
+PAYMENT_STATUS_BUCKETS = {
+    "completed": "pending",  # paid by the company, held until the service is confirmed
+    "released": "released",
+    "in_dispute": "in_dispute",
+    "refunded": "refunded",
+}
+BALANCE_BUCKETS = ["pending", "in_dispute", "released", "refunded"]
+LEDGER_PAYMENT_FIELDS = {"id": 1, "service_request_id": 1, "professional_id": 1, "company_id": 1, "amount": 1, "status": 1}
+
+class LedgerEntry(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    payment_id: str
+    service_request_id: str
+    professional_id: str
+    company_id: str
+    event: str  # the payment status entered: completed, released, in_dispute, refunded
+    amount: float
+    from_bucket: Optional[str] = None
+    to_bucket: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+def balance_updates(entries: List[dict]) -> List[UpdateOne]:
+    # Net every entry's bucket movement into one $inc per balance owner
+    increments = {}
+    for entry in entries:
+        for owner_id, owner_type in ((entry["professional_id"], "professional"), (entry["company_id"], "company")):
+            key = (owner_id, owner_type)
+            owner = increments.setdefault(key, {})
+            if entry["from_bucket"]:
+                owner[entry["from_bucket"]] = owner.get(entry["from_bucket"], 0) - entry["amount"]
+            if entry["to_bucket"]:
+                owner[entry["to_bucket"]] = owner.get(entry["to_bucket"], 0) + entry["amount"]
+    now = datetime.now(timezone.utc)
+    return [
+        UpdateOne(
+            {"owner_id": owner_id, "owner_type": owner_type},
+            {"$inc": amounts, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for (owner_id, owner_type), amounts in increments.items()
+    ]
+
+async def record_payment_transition(payment: dict, new_status: str, session=None):
+    """Append the ledger entry for a payment entering new_status and move both balances.
+    `payment` is the document as it was before the transition (empty status for new payments)."""
+    entry = LedgerEntry(
+        payment_id=payment["id"],
+        service_request_id=payment["service_request_id"],
+        professional_id=payment["professional_id"],
+        company_id=payment["company_id"],
+        event=new_status,
+        amount=payment["amount"],
+        from_bucket=PAYMENT_STATUS_BUCKETS.get(payment.get("status")),
+        to_bucket=PAYMENT_STATUS_BUCKETS.get(new_status)
+    ).dict()
+    await db.payment_ledger.insert_one(entry, session=session)
+    await db.balances.bulk_write(balance_updates([entry]), ordered=False, session=session)
+
+async def backfill_payment_ledger(batch_size: int = 1000):
+    """Open ledger entries for payments that predate the ledger and add them to the balances.
+    Balances are never rebuilt from scratch: live transitions keep $inc-ing them meanwhile, and
+    increments commute where a wipe-and-replay would lose or double-apply them."""
+    recorded = set(await db.payment_ledger.distinct("payment_id"))
+    entries = []
+    
+    async def write(session):
+        # Payments created since the scan began already have an entry from their live transition
+        opened = set(await db.payment_ledger.distinct(
+            "payment_id", {"payment_id": {"$in": [entry["payment_id"] for entry in entries]}}, session=session
+        ))
+        missing = [entry for entry in entries if entry["payment_id"] not in opened]
+        if missing:
+            await db.payment_ledger.insert_many(missing, ordered=False, session=session)
+            await db.balances.bulk_write(balance_updates(missing), ordered=False, session=session)
+    
+    async for payment in db.payments.find({}, {**LEDGER_PAYMENT_FIELDS, "_id": 0}).batch_size(batch_size):
+        if payment["id"] in recorded or payment["status"] not in PAYMENT_STATUS_BUCKETS:
+            continue
+        entries.append(LedgerEntry(
+            payment_id=payment["id"],
+            service_request_id=payment["service_request_id"],
+            professional_id=payment["professional_id"],
+            company_id=payment["company_id"],
+            event=payment["status"],
+            amount=payment["amount"],
+            to_bucket=PAYMENT_STATUS_BUCKETS[payment["status"]]
+        ).dict())
+        if len(entries) >= batch_size:
+            await run_in_transaction(write)
+            entries = []
+    if entries:
+        await run_in_transaction(write)
+
+# Real-time events: service-request lifecycle pushed to the users involved
+EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', '100'))
+EVENT_HEARTBEAT_SECONDS = float(os.environ.get('EVENT_HEARTBEAT_SECONDS', '30'))
+
+class LocalEventBackend:
+    """Delivers events to this worker's subscribers only; the single-process and test stand-in"""
+    
+    def __init__(self):
+        # Publishing before start (maintenance commands) has no subscribers to reach
+        self.deliver = lambda message: None
+    
+    async def start(self, deliver):
+        self.deliver = deliver
+    
+    async def publish(self, message: dict):
+        self.deliver(message)
+    
+    async def close(self):
+        pass
+
+class MongoEventBackend:
+    """Cross-worker fan-out: every worker tails a capped collection that publishers append to"""
+    
+    def __init__(self, collection: str = "events", size_bytes: int = 16 * 1024 * 1024):
+        self.collection = collection
+        self.size_bytes = size_bytes
+        self.task = None
+    
+    async def start(self, deliver):
+        self.deliver = deliver
+        try:
+            await db.create_collection(self.collection, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass
+        # Only events published after this worker started are delivered
+        latest = await db[self.collection].find_one({}, {"_id": 1}, sort=[("$natural", -1)])
+        self.task = asyncio.create_task(self._tail(latest["_id"] if latest else None))
+    
+    async def publish(self, message: dict):
+        await db[self.collection].insert_one({"message": message})
+    
+    async def _tail(self, last_id):
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            cursor = db[self.collection].find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+            try:
+                while cursor.alive:
+                    async for document in cursor:
+                        last_id = document["_id"]
+                        self.deliver(document["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Event tail failed, restarting")
+            # Tailable cursors die on an empty collection; retry shortly
+            await asyncio.sleep(1)
+    
+    async def close(self):
+        if self.task:
+            self.task.cancel()
+
+EVENT_BACKENDS = {"local": LocalEventBackend, "mongo": MongoEventBackend}
+
+class EventHub:
+    """In-process pub/sub keyed by user id with a bounded buffer per connection"""
+    
+    def __init__(self, backend, buffer_size: int):
+        self.backend = backend
+        self.buffer_size = buffer_size
+        self.subscribers = {}  # user_id -> set of queues
+        self.handlers = {}  # event type -> callback for worker-level events such as version bumps
+        self.dropped = 0
+    
+    async def start(self):
+        await self.backend.start(self.deliver)
+    
+    async def close(self):
+        await self.backend.close()
+    
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.buffer_size)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+    
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+    
+    def on(self, event_type: str, handler):
+        self.handlers[event_type] = handler
+    
+    def deliver(self, message: dict):
+        handler = self.handlers.get(message["type"])
+        if handler is not None:
+            handler(message["data"])
+        # Serialize once and share the frame across every recipient connection
+        frame = None
+        for user_id in message["user_ids"]:
+            for queue in self.subscribers.get(user_id, ()):
+                if frame is None:
+                    frame = b"event: " + message["type"].encode() + b"\ndata: " + orjson.dumps(message["data"]) + b"\n\n"
+                if queue.full():
+                    # Slow consumers lose their oldest events rather than growing without bound
+                    queue.get_nowait()
+                    self.dropped += 1
+                queue.put_nowait(frame)
+    
+    async def publish(self, user_ids: List[str], event_type: str, data: dict):
+        await self.backend.publish({"user_ids": list(user_ids), "type": event_type, "data": data})
+
+event_hub = EventHub(
+    EVENT_BACKENDS[os.environ.get('EVENT_BACKEND', 'local')](),
+    EVENT_BUFFER_SIZE
+)
+
+async def publish_event(user_ids: List[str], event_type: str, data: dict):
+    # Notification is best effort; a failed publish never fails the write that triggered it
+    try:
+        await event_hub.publish(user_ids, event_type, jsonable_encoder(data))
+    except Exception:
+        logger.exception("Could not publish %s event", event_type)
+
+# Notifications: handlers enqueue a job, which fans out into per-user inbox documents
+NOTIFICATION_READ_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_READ_RETENTION_DAYS', '30'))
+
+async def enqueue_notification(user_ids: List[str], type: str, title: str, body: str = "", data: Optional[dict] = None):
+    if not user_ids:
+        return
+    await enqueue_job("deliver_notifications", {
+        "batch_id": str(uuid.uuid4()),
+        "user_ids": list(user_ids),
+        "type": type,
+        "title": title,
+        "body": body,
+        "data": data or {}
+    })
+
+@job_handler("deliver_notifications")
+async def deliver_notifications(batch_id: str, user_ids: List[str], type: str, title: str, body: str = "", data: Optional[dict] = None):
+    # Ids derive from the batch, so a retried job skips the inbox entries (and unread counts) it already wrote
+    namespace = uuid.UUID(batch_id)
+    notifications = [
+        Notification(id=str(uuid.uuid5(namespace, user_id)), user_id=user_id, type=type, title=title, body=body, data=data or {}).dict()
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    
+    async def write(session):
+        # Without transactions a crash between the two writes leaves those users' unread counts one short
+        written = {
+            existing["id"] async for existing in db.notifications.find(
+                {"id": {"$in": [n["id"] for n in notifications]}}, {"_id": 0, "id": 1}, session=session
+            )
+        }
+        fresh = [n for n in notifications if n["id"] not in written]
+        if fresh:
+            await db.notifications.insert_many(fresh, ordered=False, session=session)
+            await db.notification_counters.bulk_write([
+                UpdateOne({"user_id": n["user_id"]}, {"$inc": {"unread": 1}}, upsert=True)
+                for n in fresh
+            ], ordered=False, session=session)
+        return fresh
+    
+    for notification in await run_in_transaction(write):
+        notification.pop("_id", None)
+        await publish_event([notification["user_id"]], "notification.created", notification)
+
+async def request_parties(request_id: str) -> List[str]:
+    service_request = await db.service_requests.find_one(
+        {"id": request_id}, {"professional_id": 1, "company_id": 1}
+    )
+    if not service_request:
+        return []
+    return [service_request["professional_id"], service_request["company_id"]]
+
+# Account construction shared by registration and bulk import
+def build_account(user_data: dict):
+    """Build the user document and its type-specific profile (None for unknown types)"""
+    user_type = user_data.get("user_type", "professional")
+    new_user = User(
+        email=user_data.get("email"),
+        user_type=user_type,
+        full_name=user_data.get("full_name", ""),
+        phone=user_data.get("phone", ""),
+        location=user_data.get("location", "Bogotá")
+    )
+    new_user.location_point = geocode_location(new_user.location)
+    
+    profile = None
+    if user_type == "professional":
+        profile = Professional(
+            user_id=new_user.id,
+            specialties=user_data.get("specialties", []),
+            experience_years=user_data.get("experience_years", 0),
+            bio=user_data.get("bio", ""),
+            education=user_data.get("education", ""),
+            certifications=user_data.get("certifications", []),
+            hourly_rate=user_data.get("hourly_rate"),
+            skills=user_data.get("skills", []),
+            areas_of_expertise=user_data.get("areas_of_expertise", []),
+            location_point=new_user.location_point,
+            location_terms=location_terms(new_user.location)
+        )
+    elif user_type == "company":
+        profile = Company(
+            user_id=new_user.id,
+            company_name=user_data.get("company_name", ""),
+            company_type=user_data.get("company_type", ""),
+            description=user_data.get("description", ""),
+            size=user_data.get("size", ""),
+            services_offered=user_data.get("services_offered", []),
+            requirements=user_data.get("requirements", [])
+        )
+    elif user_type == "supplier":
+        profile = Supplier(
+            user_id=new_user.id,
+            company_name=user_data.get("company_name", ""),
+            products_services=user_data.get("products_services", []),
+            description=user_data.get("description", ""),
+            certifications=user_data.get("certifications", [])
+        )
+    return new_user, profile
+
+# Bulk import: stream NDJSON or CSV rows, validate, and insert in unordered batches
+IMPORT_MODELS = {"professional": ProfessionalCreate, "company": CompanyCreate, "supplier": SupplierCreate}
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '500'))
+IMPORT_ERROR_LIMIT = 1000  # rows reported individually; further failures are only counted
+CSV_LIST_SEPARATOR = "|"
+
+async def iter_text_lines(chunks):
+    """Split an async stream of byte chunks into text lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def iter_file_chunks(path: str, chunk_size: int = 1 << 16):
+    with open(path, "rb") as handle:
+        while chunk := handle.read(chunk_size):
+            yield chunk
+
+async def iter_import_rows(lines, file_format: str):
+    """Yield (line_number, row dict or error message); CSV records must fit on one line"""
+    header = None
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            if file_format == "csv":
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                yield line_number, {name: value for name, value in zip(header, values) if value != ""}
+            else:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("row must be a JSON object")
+                yield line_number, row
+        except (ValueError, csv.Error) as e:
+            yield line_number, f"Unparseable row: {e}"
+
+def validate_import_row(row: dict, default_user_type: Optional[str]):
+    user_type = row.get("user_type") or default_user_type
+    model = IMPORT_MODELS.get(user_type)
+    if model is None:
+        raise ValueError(f"Unknown user_type: {user_type}")
+    # CSV cells arrive as strings; list fields use a pipe-separated cell
+    for name, field in model.model_fields.items():
+        if field.annotation == List[str] and isinstance(row.get(name), str):
+            row[name] = [item.strip() for item in row[name].split(CSV_LIST_SEPARATOR) if item.strip()]
+    return model(**{**row, "user_type": user_type})
+
+def import_error_message(error: ValueError) -> str:
+    # pydantic's own text echoes the input, and for an import row that includes the password
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}"
+            for detail in error.errors(include_input=False)
+        )
+    return str(error)
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+    
+    def fail(self, line_number: int, error: str):
+        self.failed += 1
+        if len(self.errors) < IMPORT_ERROR_LIMIT:
+            self.errors.append({"line": line_number, "error": error})
+    
+    def dict(self):
+        return {"imported": self.imported, "failed": self.failed, "errors": self.errors}
+
+async def write_import_batch(batch: List[tuple], report: ImportReport):
+    """Hash on the password pool, then insert users and profiles with unordered insert_many"""
+    hashes = await asyncio.gather(*(hash_password_async(row.password) for _, row in batch))
+    accounts = []
+    for (line_number, row), hashed_password in zip(batch, hashes):
+        new_user, profile = build_account(row.dict())
+        accounts.append((line_number, new_user, profile, hashed_password))
+    
+    rejected = set()
+    try:
+        await db.users.insert_many(
+            [{**user.dict(), "hashed_password": hashed} for _, user, _, hashed in accounts],
+            ordered=False
         )
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            line_number = accounts[error["index"]][0]
+            rejected.add(error["index"])
+            message = "Email already registered" if error.get("code") == 11000 else error.get("errmsg", "Write failed")
+            report.fail(line_number, message)
+    
+    inserted = [account for index, account in enumerate(accounts) if index not in rejected]
+    profiles = {}
+    for _, user, profile, _ in inserted:
+        profiles.setdefault(PROFILE_COLLECTIONS[user.user_type], []).append(profile.dict())
+    for collection, documents in profiles.items():
+        await db[collection].insert_many(documents, ordered=False)
+    professionals = [
+        {**user.dict(), **profile.dict()} for _, user, profile, _ in inserted if user.user_type == "professional"
+    ]
+    if professionals:
+        await index_professionals(professionals)
+    
+    report.imported += len(inserted)
+    if inserted:
+        await bump_version("users", *profiles)
+
+async def import_profiles(lines, file_format: str = "ndjson", default_user_type: Optional[str] = None) -> ImportReport:
+    """Import accounts from a line stream, holding at most one batch in memory"""
+    report = ImportReport()
+    batch = []
+    emails = set()
+    async for line_number, row in iter_import_rows(lines, file_format):
+        if isinstance(row, str):
+            report.fail(line_number, row)
+            continue
+        try:
+            account = validate_import_row(row, default_user_type)
+        except ValueError as e:  # pydantic's ValidationError is a ValueError
+            report.fail(line_number, import_error_message(e))
+            continue
+        # Repeats inside a batch would race each other; the unique index catches the rest
+        if account.email.lower() in emails:
+            report.fail(line_number, "Duplicate email in import batch")
+            continue
+        emails.add(account.email.lower())
+        batch.append((line_number, account))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await write_import_batch(batch, report)
+            batch = []
+            emails = set()
+    if batch:
+        await write_import_batch(batch, report)
+    return report
 
 # Routes
 @api_router.get("/")
@@ -380,69 +2078,26 @@ async def register_user(user_data: dict):
     password = user_data.get("password")
     user_type = user_data.get("user_type", "professional")
     
-    # Check if user already exists
-    existing = await db.users.find_one({"email": email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-    
     # Hash password and create user
-    hashed_password = get_password_hash(password)
-    
-    # Create base user
-    new_user = User(
-        email=email,
-        user_type=user_type,
-        full_name=user_data.get("full_name", ""),
-        phone=user_data.get("phone", ""),
-        location=user_data.get("location", "Bogotá")
-    )
+    hashed_password = await hash_password_async(password)
+    new_user, profile = build_account(user_data)
     
     # Store user in database with hashed password
     user_dict = new_user.dict()
     user_dict["hashed_password"] = hashed_password
     
-    await db.users.insert_one(user_dict)
+    # The unique index on users.email rejects duplicates atomically
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Create specific profile based on user type
-    profile = None
+    if profile:
+        await db[PROFILE_COLLECTIONS[user_type]].insert_one(profile.dict())
     if user_type == "professional":
-        profile_data = {
-            "user_id": new_user.id,
-            "specialties": user_data.get("specialties", []),
-            "experience_years": user_data.get("experience_years", 0),
-            "bio": user_data.get("bio", ""),
-            "education": user_data.get("education", ""),
-            "certifications": user_data.get("certifications", []),
-            "hourly_rate": user_data.get("hourly_rate"),
-            "skills": user_data.get("skills", []),
-            "areas_of_expertise": user_data.get("areas_of_expertise", [])
-        }
-        profile = Professional(**profile_data)
-        await db.professionals.insert_one(profile.dict())
+        await index_professionals([{**new_user.dict(), **profile.dict()}])
     
-    elif user_type == "company":
-        profile_data = {
-            "user_id": new_user.id,
-            "company_name": user_data.get("company_name", ""),
-            "company_type": user_data.get("company_type", ""),
-            "description": user_data.get("description", ""),
-            "size": user_data.get("size", ""),
-            "services_offered": user_data.get("services_offered", []),
-            "requirements": user_data.get("requirements", [])
-        }
-        profile = Company(**profile_data)
-        await db.companies.insert_one(profile.dict())
-    
-    elif user_type == "supplier":
-        profile_data = {
-            "user_id": new_user.id,
-            "company_name": user_data.get("company_name", ""),
-            "products_services": user_data.get("products_services", []),
-            "description": user_data.get("description", ""),
-            "certifications": user_data.get("certifications", [])
-        }
-        profile = Supplier(**profile_data)
-        await db.suppliers.insert_one(profile.dict())
+    await bump_version("users", PROFILE_COLLECTIONS.get(user_type, "users"))
     
     # Create access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -459,124 +2114,226 @@ async def register_user(user_data: dict):
 
 @api_router.post("/auth/login", response_model=Token)
 async def login_user(login_data: UserLogin):
-    user = await db.users.find_one({"email": login_data.email})
-    if not user or not verify_password(login_data.password, user.get("hashed_password", "")):
+    user, profile = await find_user_with_profile({"email": login_data.email}, NO_ID)
+    hashed_password = user.get("hashed_password", "") if user else DUMMY_PASSWORD_HASH
+    if not await verify_password_async(login_data.password, hashed_password) or not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user profile based on type
-    profile = None
-    if user["user_type"] == "professional":
-        profile_data = await db.professionals.find_one({"user_id": user["id"]})
-        if profile_data:
-            profile = Professional(**profile_data)
-    elif user["user_type"] == "company":
-        profile_data = await db.companies.find_one({"user_id": user["id"]})
-        if profile_data:
-            profile = Company(**profile_data)
-    elif user["user_type"] == "supplier":
-        profile_data = await db.suppliers.find_one({"user_id": user["id"]})
-        if profile_data:
-            profile = Supplier(**profile_data)
+    # Transparently upgrade legacy or weaker hashes now that we know the password
+    if password_needs_rehash(hashed_password):
+        await db.users.update_one(
+            {"id": user["id"], "hashed_password": hashed_password},
+            {"$set": {"hashed_password": await hash_password_async(login_data.password)}}
+        )
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": login_data.email}, expires_delta=access_token_expires
     )
     
-    # Remove hashed_password from response
-    user_data = user.copy()
-    del user_data["hashed_password"]
+    # Remove hashed_password from response and warm the principal cache for the new session
+    del user["hashed_password"]
+    current_user = User(**user)
+    principal_cache.set(login_data.email, current_user)
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
-        "user": User(**user_data),
-        "profile": profile.dict() if profile else None
+        "user": current_user,
+        "profile": profile
     }
 
+@api_router.post("/admin/import")
+async def bulk_import_profiles(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    user_type: Optional[str] = Query(None, pattern="^(professional|company|supplier)$"),
+    admin: User = Depends(get_admin_user)
+):
+    """Import professionals, companies and suppliers from an NDJSON or CSV request body"""
+    report = await import_profiles(iter_text_lines(request.stream()), format, user_type)
+    logger.info("Bulk import by %s: %d imported, %d failed", admin.email, report.imported, report.failed)
+    return report.dict()
+
+# Aggregation stages joining a profile with its user document
+USER_JOIN_STAGES = [
+    {"$lookup": {
+        "from": "users",
+        "localField": "user_id",
+        "foreignField": "id",
+        "as": "user"
+    }},
+    {"$unwind": "$user"},
+]
+
+# Combine user and profile data, profile fields take precedence
+MERGE_USER_STAGES = [
+    {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$user", "$$ROOT"]}}},
+    {"$project": {"_id": 0, "user": 0, "hashed_password": 0, "location_terms": 0}},
+]
+
+async def fetch_professionals_by_user_ids(user_ids: List[str]) -> List[dict]:
+    """Load directory entries for the given users in one round trip, preserving order"""
+    pipeline = [{"$match": {"user_id": {"$in": user_ids}}}] + USER_JOIN_STAGES + MERGE_USER_STAGES
+    by_user_id = {p["user_id"]: p async for p in db.professionals.aggregate(pipeline)}
+    return [by_user_id[user_id] for user_id in user_ids if user_id in by_user_id]
+
+# Pagination helpers
+def encode_directory_cursor(profile: dict, sort_field: str = "average_rating") -> str:
+    # Opaque keyset cursor over the (sort_field, id) sort key
+    raw = json.dumps([profile.get(sort_field, 0.0), profile["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_directory_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        rating, profile_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return float(rating), str(profile_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_timeline_cursor(document: dict) -> str:
+    # Opaque keyset cursor over the (created_at, id) sort key of newest-first feeds
+    raw = json.dumps([document["created_at"].isoformat(), document["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_timeline_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(document_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 # Professional routes
 @api_router.get("/professionals")
-async def get_professionals(specialty: Optional[str] = None, location: Optional[str] = None):
-    # Get all professional profiles
-    professional_profiles = await db.professionals.find().to_list(100)
-    
-    result = []
-    for prof_profile in professional_profiles:
-        # Remove MongoDB ObjectId and convert to dict
-        prof_profile_clean = {k: v for k, v in prof_profile.items() if k != "_id"}
-        
-        # Get user data
-        user_data = await db.users.find_one({"id": prof_profile_clean["user_id"]})
-        if user_data:
-            # Remove hashed_password and ObjectId
-            user_data_clean = {k: v for k, v in user_data.items() if k not in ["hashed_password", "_id"]}
-            
-            # Combine user and profile data
-            combined = {**user_data_clean, **prof_profile_clean}
-            
-            # Apply filters
-            if specialty and specialty not in prof_profile_clean.get("specialties", []):
-                continue
-            if location and location.lower() not in user_data_clean.get("location", "").lower():
-                continue
-                
-            result.append(combined)
-    
-    return result
-
-@api_router.get("/professionals/{professional_id}")
-async def get_professional(professional_id: str):
-    # First try to find by user_id in professionals collection
-    professional = await db.professionals.find_one({"user_id": professional_id})
-    if professional:
-        # Remove MongoDB ObjectId
-        professional_clean = {k: v for k, v in professional.items() if k != "_id"}
-        
-        # Get user data
-        user_data = await db.users.find_one({"id": professional_id})
-        if user_data:
-            user_data_clean = {k: v for k, v in user_data.items() if k not in ["hashed_password", "_id"]}
-            return {**user_data_clean, **professional_clean}
-    
-    # Try to find by id in professionals collection (backward compatibility)
-    professional = await db.professionals.find_one({"id": professional_id})
-    if professional:
-        professional_clean = {k: v for k, v in professional.items() if k != "_id"}
-        return professional_clean
-        
-    raise HTTPException(status_code=404, detail="Professional not found")
+async def get_professionals(
+    request: Request,
+    specialty: Optional[str] = None,
+    location: Optional[str] = None,
+    near: Optional[str] = None,
+    radius_km: float = Query(50.0, gt=0, le=2000),
+    limit: int = Query(100, ge=1, le=100),
+    after: Optional[str] = None
+):
+    """List professionals ordered by rating, or by distance when `near` is given,
+    paginated with an opaque keyset cursor"""
+    etag = collection_etag("users", "professionals")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    # Indexed filters run against the professionals collection before the join
+    query = {}
+    if specialty:
+        query["specialties"] = specialty
+    if location:
+        terms = location_terms(location)
+        if not terms:
+            raise HTTPException(status_code=400, detail="Invalid location")
+        # Every word of the filter must appear in the location, ignoring case and accents
+        query["location_terms"] = {"$all": terms}
+    
+    if near:
+        sort_field = "distance_km"
+        geo_near = {
+            "near": resolve_near(near),
+            "key": "location_point",
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius_km * 1000,
+            "spherical": True,
+            "query": query
+        }
+        pipeline = [{"$geoNear": geo_near}]
+        if after:
+            last_distance, last_id = decode_directory_cursor(after)
+            # Skip nearer professionals inside the index scan, then break distance ties by id
+            geo_near["minDistance"] = max(last_distance * 1000 - 1, 0)
+            pipeline.append({"$match": {"$or": [
+                {"distance_km": {"$gt": last_distance}},
+                {"distance_km": last_distance, "id": {"$gt": last_id}}
+            ]}})
+        pipeline.append({"$sort": {"distance_km": 1, "id": 1}})
+    else:
+        sort_field = "average_rating"
+        if after:
+            last_rating, last_id = decode_directory_cursor(after)
+            query["$or"] = [
+                {"average_rating": {"$lt": last_rating}},
+                {"average_rating": last_rating, "id": {"$lt": last_id}}
+            ]
+        pipeline = [
+            {"$match": query},
+            {"$sort": {"average_rating": -1, "id": -1}},
+        ]
+    
+    # Fetch one extra document to know whether another page exists
+    pipeline.append({"$limit": limit + 1})
+    
+    # Join profiles with their user documents server-side in a single round trip
+    pipeline += USER_JOIN_STAGES + MERGE_USER_STAGES
+    
+    result = await db.professionals.aggregate(pipeline).to_list(None)
+    headers = {}
+    if len(result) > limit:
+        result = result[:limit]
+        headers["X-Next-Cursor"] = encode_directory_cursor(result[-1], sort_field)
+    
+    return cacheable_response(result, etag, headers)
+
+@api_router.get("/professionals/search")
+async def search_professionals(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Rank professionals by relevance across specialties, skills, bio, expertise and education"""
+    matches = search_index.search(q, limit)
+    scores = dict(matches)
+    professionals = await fetch_professionals_by_user_ids([user_id for user_id, _ in matches])
+    for professional in professionals:
+        professional["score"] = round(scores[professional["user_id"]], 4)
+    return ORJSONResponse(professionals)
 
 @api_router.get("/professionals/me")
-async def get_current_user_profile(current_user: User = Depends(get_current_user)):
-    # Get user profile based on type
-    profile = None
-    if current_user.user_type == "professional":
-        profile_data = await db.professionals.find_one({"user_id": current_user.id})
-        if profile_data:
-            # Remove MongoDB ObjectId
-            profile_data_clean = {k: v for k, v in profile_data.items() if k != "_id"}
-            profile = {**current_user.dict(), **profile_data_clean}
-    elif current_user.user_type == "company":
-        profile_data = await db.companies.find_one({"user_id": current_user.id})
-        if profile_data:
-            profile_data_clean = {k: v for k, v in profile_data.items() if k != "_id"}
-            profile = {**current_user.dict(), **profile_data_clean}
-    elif current_user.user_type == "supplier":
-        profile_data = await db.suppliers.find_one({"user_id": current_user.id})
-        if profile_data:
-            profile_data_clean = {k: v for k, v in profile_data.items() if k != "_id"}
-            profile = {**current_user.dict(), **profile_data_clean}
-    
-    return profile or current_user.dict()
+async def get_current_user_profile(profile: dict = Depends(get_current_user_with_profile)):
+    return profile
+
+@api_router.get("/professionals/{professional_id}")
+async def get_professional(professional_id: str, request: Request):
+    etag = collection_etag("users", "professionals")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    # Match by user_id, or by profile id for backward compatibility, joined with the user
+    pipeline = [
+        {"$match": {"$or": [{"user_id": professional_id}, {"id": professional_id}]}},
+        {"$limit": 2},
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "id",
+            "as": "user"
+        }},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+    ] + MERGE_USER_STAGES
+    professionals = await db.professionals.aggregate(pipeline).to_list(2)
+    if not professionals:
+        raise HTTPException(status_code=404, detail="Professional not found")
+    
+    # Prefer the user_id match when both keys hit different profiles
+    professionals.sort(key=lambda p: p.get("user_id") != professional_id)
+    return cacheable_response(professionals[0], etag)
 
 @api_router.get("/users/me")
-async def get_user_me(current_user: User = Depends(get_current_user)):
+async def get_user_me(profile: dict = Depends(get_current_user_with_profile)):
     """Get current user profile with all related data based on user type"""
-    return await get_current_user_profile(current_user)
+    return profile
 
 @api_router.put("/professionals/me")
 async def update_user_profile(
@@ -589,55 +2346,90 @@ async def update_user_profile(
     # Update user data
     user_fields = ["full_name", "phone", "location"]
     user_updates = {k: v for k, v in update_data.items() if k in user_fields}
+    if "location" in user_updates:
+        user_updates["location_point"] = geocode_location(user_updates["location"])
     if user_updates:
         await db.users.update_one(
             {"id": current_user.id},
             {"$set": user_updates}
         )
+        await bump_version("users")
+        await invalidate_principal(current_user.email)
+        current_user = current_user.copy(update=user_updates)
     
     # Update profile data based on user type
     if current_user.user_type == "professional":
         profile_fields = ["specialties", "experience_years", "bio", "education", "certifications", 
                          "hourly_rate", "skills", "areas_of_expertise", "availability_status"]
         profile_updates = {k: v for k, v in update_data.items() if k in profile_fields}
+        if "location" in user_updates:
+            profile_updates["location_point"] = user_updates["location_point"]
+            profile_updates["location_terms"] = location_terms(user_updates["location"])
         if profile_updates:
             await db.professionals.update_one(
                 {"user_id": current_user.id},
                 {"$set": profile_updates}
             )
+            await bump_version("professionals")
     
     # Get updated profile
-    return await get_current_user_profile(current_user)
+    profile = merge_profile(current_user.dict(), await find_profile(current_user.id, current_user.user_type))
+    if current_user.user_type == "professional":
+        await index_professionals([{**profile, "user_id": current_user.id}])
+    return profile
 
 # Review routes
 @api_router.post("/reviews", response_model=Review)
 async def create_review(review: ReviewCreate):
     # Verify user exists
-    user = await db.users.find_one({"id": review.reviewed_user_id})
+    user = await db.users.find_one({"id": review.reviewed_user_id}, {"user_type": 1})
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     new_review = Review(**review.dict())
     await db.reviews.insert_one(new_review.dict())
-    
-    # Update user's average rating
-    await update_user_ratings(review.reviewed_user_id)
+    await record_review_summary(new_review.dict())
+    add_recent_review(new_review.dict())
+    # Other workers get the review ahead of the version bump that changes their ETag
+    await publish_event([], "review.created", new_review.dict())
+    await bump_version("reviews")
+    
+    # Rating totals are folded in by a background job
+    await enqueue_job("apply_review_rating", {
+        "review_id": new_review.id,
+        "user_id": review.reviewed_user_id,
+        "user_type": user["user_type"],
+        "rating": review.rating
+    })
     
     return new_review
 
 @api_router.get("/reviews/professional/{user_id}", response_model=List[Review])
 async def get_user_reviews(user_id: str):
-    reviews = await db.reviews.find({"reviewed_user_id": user_id}).sort("created_at", -1).to_list(100)
-    return [Review(**review) for review in reviews]
+    reviews = await db.reviews.find({"reviewed_user_id": user_id}, PUBLIC_REVIEW).sort("created_at", -1).to_list(100)
+    return ORJSONResponse(reviews)
 
 @api_router.get("/reviews", response_model=List[Review])
-async def get_all_reviews():
-    reviews = await db.reviews.find().sort("created_at", -1).to_list(100)
-    return [Review(**review) for review in reviews]
+async def get_all_reviews(request: Request):
+    etag = collection_etag("reviews")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    return cacheable_response(list(recent_reviews), etag)
+
+@api_router.get("/reviews/summary/{user_id}", response_model=ReviewSummary)
+async def get_user_review_summary(user_id: str, request: Request):
+    etag = collection_etag("reviews")
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    return cacheable_response(await get_review_summary(user_id), etag)
 
 # Specialty routes
 @api_router.get("/specialties")
-async def get_specialties():
+async def get_specialties(request: Request):
     specialties = [
         "Ortopedia",
         "Columna",
@@ -655,7 +2447,13 @@ async def get_specialties():
         "Patología",
         "Medicina Interna"
     ]
-    return {"specialties": specialties}
+    # The list only changes with the code, so its ETag is a hash of the content
+    etag = '"' + hashlib.sha256(orjson.dumps(specialties)).hexdigest()[:16] + '"'
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    
+    return cacheable_response({"specialties": specialties}, etag)
 
 # Status check route (keeping original for compatibility)
 @api_router.post("/status", response_model=StatusCheck)
@@ -667,8 +2465,8 @@ async def create_status_check(input: StatusCheckCreate):
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    status_checks = await db.status_checks.find({}, NO_ID).to_list(1000)
+    return ORJSONResponse(status_checks)
 
 # Service Request routes
 @api_router.post("/service-requests", response_model=ServiceRequest)
@@ -684,7 +2482,7 @@ async def create_service_request(
         )
     
     # Get company profile to include contact info
-    company_profile = await db.companies.find_one({"user_id": current_user.id})
+    company_profile = await db.companies.find_one({"user_id": current_user.id}, {"company_name": 1})
     if not company_profile:
         raise HTTPException(status_code=404, detail="Company profile not found")
     
@@ -700,6 +2498,18 @@ async def create_service_request(
     )
     
     await db.service_requests.insert_one(service_request.dict())
+    await publish_event(
+        [service_request.professional_id, service_request.company_id],
+        "service_request.created",
+        service_request.dict()
+    )
+    await enqueue_notification(
+        [service_request.professional_id],
+        "service_request.created",
+        f"Nueva solicitud de servicio de {service_request.company_name}",
+        service_request.message,
+        {"service_request_id": service_request.id}
+    )
     return service_request
 
 @api_router.get("/service-requests/received")
@@ -712,11 +2522,10 @@ async def get_received_service_requests(current_user: User = Depends(get_current
         )
     
     requests = await db.service_requests.find(
-        {"professional_id": current_user.id}
+        {"professional_id": current_user.id}, NO_ID
     ).sort("created_at", -1).to_list(100)
     
-    requests_clean = [{k: v for k, v in req.items() if k != "_id"} for req in requests]
-    return requests_clean
+    return ORJSONResponse(requests)
 
 @api_router.get("/service-requests/sent")
 async def get_sent_service_requests(current_user: User = Depends(get_current_user)):
@@ -728,11 +2537,10 @@ async def get_sent_service_requests(current_user: User = Depends(get_current_use
         )
     
     requests = await db.service_requests.find(
-        {"company_id": current_user.id}
+        {"company_id": current_user.id}, NO_ID
     ).sort("created_at", -1).to_list(100)
     
-    requests_clean = [{k: v for k, v in req.items() if k != "_id"} for req in requests]
-    return requests_clean
+    return ORJSONResponse(requests)
 
 @api_router.patch("/service-requests/{request_id}")
 async def update_service_request(
@@ -747,39 +2555,46 @@ async def update_service_request(
             detail="Only professionals can update service requests"
         )
     
-    service_request = await db.service_requests.find_one({"id": request_id})
-    if not service_request:
-        raise HTTPException(status_code=404, detail="Service request not found")
-    
-    if service_request["professional_id"] != current_user.id:
-        raise HTTPException(
-            status_code=403,
-            detail="You can only update your own service requests"
-        )
-    
     if update_data.status not in ["approved", "rejected"]:
         raise HTTPException(
             status_code=400,
             detail="Status must be 'approved' or 'rejected'"
         )
     
-    result = await db.service_requests.update_one(
-        {"id": request_id},
-        {
-            "$set": {
-                "status": update_data.status,
-                "updated_at": datetime.now(timezone.utc)
-            }
-        }
+    updated_request = await apply_transition(
+        "service_requests",
+        {"id": request_id, "professional_id": current_user.id},
+        status_precondition("service_request", update_data.status),
+        {"status": update_data.status}
     )
+    if not updated_request:
+        existing = await db.service_requests.find_one({"id": request_id}, {"professional_id": 1, "status": 1})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Service request not found")
+        if existing["professional_id"] != current_user.id:
+            raise HTTPException(
+                status_code=403,
+                detail="You can only update your own service requests"
+            )
+        raise HTTPException(
+            status_code=409,
+            detail=f"Service request is already {existing['status']}"
+        )
     
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Service request not found")
-    
-    updated_request = await db.service_requests.find_one({"id": request_id})
-    updated_request_clean = {k: v for k, v in updated_request.items() if k != "_id"}
+    await publish_event(
+        [updated_request["professional_id"], updated_request["company_id"]],
+        f"service_request.{update_data.status}",
+        updated_request
+    )
+    if update_data.status == "approved":
+        await enqueue_notification(
+            [updated_request["company_id"]],
+            "service_request.approved",
+            f"{current_user.full_name} aprobó tu solicitud de servicio",
+            data={"service_request_id": request_id}
+        )
     
-    return updated_request_clean
+    return ORJSONResponse(updated_request)
 
 # Payment routes
 @api_router.post("/payments", response_model=Payment)
@@ -792,7 +2607,9 @@ async def create_payment(
         raise HTTPException(status_code=403, detail="Only companies can make payments")
     
     # Verify service request exists and is approved
-    service_request = await db.service_requests.find_one({"id": payment_data.service_request_id})
+    service_request = await db.service_requests.find_one(
+        {"id": payment_data.service_request_id}, {"status": 1, "professional_id": 1}
+    )
     if not service_request:
         raise HTTPException(status_code=404, detail="Service request not found")
     
@@ -810,7 +2627,12 @@ async def create_payment(
         transaction_id=f"SIM-{uuid.uuid4().hex[:12].upper()}"
     )
     
-    await db.payments.insert_one(payment.dict())
+    async def record(session):
+        await db.payments.insert_one(payment.dict(), session=session)
+        await record_payment_transition({**payment.dict(), "status": None}, payment.status, session)
+    
+    await run_in_transaction(record)
+    await publish_event([payment.professional_id, payment.company_id], "payment.created", payment.dict())
     
     return payment
 
@@ -820,12 +2642,44 @@ async def get_payment_by_request(
     current_user: User = Depends(get_current_user)
 ):
     """Get payment for a service request"""
-    payment = await db.payments.find_one({"service_request_id": request_id})
+    payment = await db.payments.find_one({"service_request_id": request_id}, NO_ID)
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    payment_clean = {k: v for k, v in payment.items() if k != "_id"}
-    return payment_clean
+    return ORJSONResponse(payment)
+
+@api_router.get("/payments/statement")
+async def get_payment_statement(
+    limit: int = Query(50, ge=1, le=200),
+    after: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Earnings (professional) or spend (company): the balance plus a page of ledger entries"""
+    if current_user.user_type not in ("professional", "company"):
+        raise HTTPException(status_code=403, detail="Only professionals and companies have statements")
+    
+    query = {f"{current_user.user_type}_id": current_user.id}
+    if after:
+        last_created_at, last_id = decode_timeline_cursor(after)
+        query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "id": {"$lt": last_id}}
+        ]
+    
+    balance, entries = await asyncio.gather(
+        db.balances.find_one({"owner_id": current_user.id, "owner_type": current_user.user_type}, NO_ID),
+        db.payment_ledger.find(query, NO_ID).sort([("created_at", -1), ("id", -1)]).to_list(limit + 1)
+    )
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_timeline_cursor(entries[-1])
+    
+    return ORJSONResponse({
+        "balance": {bucket: (balance or {}).get(bucket, 0.0) for bucket in BALANCE_BUCKETS},
+        "entries": entries,
+        "next_cursor": next_cursor
+    })
 
 # Service Details routes
 @api_router.post("/service-details", response_model=ServiceDetails)
@@ -838,7 +2692,9 @@ async def create_service_details(
         raise HTTPException(status_code=403, detail="Only companies can send service details")
     
     # Verify payment exists and is completed
-    payment = await db.payments.find_one({"service_request_id": details_data.service_request_id})
+    payment = await db.payments.find_one(
+        {"service_request_id": details_data.service_request_id}, {"id": 1, "status": 1, "professional_id": 1}
+    )
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found for this service request")
     
@@ -859,27 +2715,34 @@ async def create_service_details(
     
     await db.service_details.insert_one(service_details.dict())
     
-    # Create service completion record
-    service_completion = ServiceCompletion(
-        service_request_id=details_data.service_request_id,
-        professional_id=payment["professional_id"]
-    )
-    await db.service_completions.insert_one(service_completion.dict())
+    # The service completion record is created by a background job
+    await enqueue_job("create_service_completion", {
+        "service_request_id": details_data.service_request_id,
+        "professional_id": payment["professional_id"]
+    })
     
     return service_details
 
+@job_handler("create_service_completion")
+async def create_service_completion(service_request_id: str, professional_id: str):
+    service_completion = ServiceCompletion(service_request_id=service_request_id, professional_id=professional_id)
+    await db.service_completions.update_one(
+        {"service_request_id": service_request_id},
+        {"$setOnInsert": service_completion.dict()},
+        upsert=True
+    )
+
 @api_router.get("/service-details/by-request/{request_id}")
 async def get_service_details(
     request_id: str,
     current_user: User = Depends(get_current_user)
 ):
     """Get service details for a service request"""
-    details = await db.service_details.find_one({"service_request_id": request_id})
+    details = await db.service_details.find_one({"service_request_id": request_id}, NO_ID)
     if not details:
         raise HTTPException(status_code=404, detail="Service details not found")
     
-    details_clean = {k: v for k, v in details.items() if k != "_id"}
-    return details_clean
+    return ORJSONResponse(details)
 
 # Service Completion routes
 @api_router.get("/service-completions/professional")
@@ -889,11 +2752,10 @@ async def get_professional_completions(current_user: User = Depends(get_current_
         raise HTTPException(status_code=403, detail="Only professionals can view their completions")
     
     completions = await db.service_completions.find(
-        {"professional_id": current_user.id}
+        {"professional_id": current_user.id}, NO_ID
     ).to_list(100)
     
-    completions_clean = [{k: v for k, v in c.items() if k != "_id"} for c in completions]
-    return completions_clean
+    return ORJSONResponse(completions)
 
 @api_router.patch("/service-completions/{request_id}/arrival")
 async def confirm_arrival(
@@ -905,25 +2767,25 @@ async def confirm_arrival(
     if current_user.user_type != "professional":
         raise HTTPException(status_code=403, detail="Only professionals can confirm arrival")
     
-    result = await db.service_completions.update_one(
-        {"service_request_id": request_id, "professional_id": current_user.id},
+    query = {"service_request_id": request_id, "professional_id": current_user.id}
+    updated = await apply_transition(
+        "service_completions",
+        query,
+        {"status": "pending", "arrival_confirmed": False},
         {
-            "$set": {
-                "arrival_confirmed": True,
-                "arrival_photo_url": arrival_data.arrival_photo_url,
-                "arrival_time": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc)
-            }
+            "arrival_confirmed": True,
+            "arrival_photo_url": arrival_data.arrival_photo_url,
+            "arrival_time": datetime.now(timezone.utc)
         }
     )
+    if not updated:
+        raise await transition_failure(
+            "service_completions", query, "Service completion not found", "Arrival already confirmed"
+        )
     
-    if result.modified_count == 0:
-        raise HTTPException(status_code=404, detail="Service completion not found")
-    
-    updated = await db.service_completions.find_one({"service_request_id": request_id})
-    updated_clean = {k: v for k, v in updated.items() if k != "_id"}
+    await publish_event(await request_parties(request_id), "service_completion.arrival_confirmed", updated)
     
-    return updated_clean
+    return ORJSONResponse(updated)
 
 @api_router.patch("/service-completions/{request_id}/company-confirm")
 async def company_confirm_completion(
@@ -935,37 +2797,75 @@ async def company_confirm_completion(
     if current_user.user_type != "company":
         raise HTTPException(status_code=403, detail="Only companies can confirm completion")
     
-    completion = await db.service_completions.find_one({"service_request_id": request_id})
-    if not completion:
-        raise HTTPException(status_code=404, detail="Service completion not found")
-    
-    if not completion["arrival_confirmed"]:
-        raise HTTPException(status_code=400, detail="Professional must confirm arrival first")
-    
-    # Update completion
-    result = await db.service_completions.update_one(
-        {"service_request_id": request_id},
-        {
-            "$set": {
+    query = {"service_request_id": request_id}
+    completion_precondition = {"status": "pending", "arrival_confirmed": True}
+    
+    async def completion_failure():
+        existing = await db.service_completions.find_one(query, {"arrival_confirmed": 1, "status": 1})
+        if not existing:
+            return HTTPException(status_code=404, detail="Service completion not found")
+        if not existing["arrival_confirmed"]:
+            return HTTPException(status_code=400, detail="Professional must confirm arrival first")
+        return HTTPException(status_code=409, detail=f"Service completion is already {existing['status']}")
+    
+    async def confirm(session):
+        # Reject ineligible completions before touching the payment
+        if not await db.service_completions.find_one({**query, **completion_precondition}, {"_id": 1}, session=session):
+            raise await completion_failure()
+        
+        # Release first, so a payment that cannot be released (e.g. under dispute) leaves the
+        # completion pending and the company can retry once it is resolved
+        payment = None
+        if confirmation_data.confirmed:
+            payment = await apply_transition(
+                "payments", query, status_precondition("payment", "released"), {"status": "released"},
+                projection=LEDGER_PAYMENT_FIELDS, session=session, return_document=ReturnDocument.BEFORE
+            )
+            if not payment:
+                raise await transition_failure("payments", query, "Payment not found", "Payment cannot be released")
+        
+        # Completing requires a confirmed arrival on a still-pending completion
+        completion = await apply_transition(
+            "service_completions",
+            query,
+            completion_precondition,
+            {
                 "company_confirmed": confirmation_data.confirmed,
                 "company_confirmation_time": datetime.now(timezone.utc),
-                "status": "completed" if confirmation_data.confirmed else "pending",
-                "updated_at": datetime.now(timezone.utc)
-            }
-        }
-    )
+                "status": "completed" if confirmation_data.confirmed else "pending"
+            },
+            session=session
+        )
+        if not completion:
+            if payment and session is None:
+                # Lost a race on the completion without a transaction: undo the release (a
+                # compensation, not a workflow transition)
+                await apply_transition("payments", {"id": payment["id"]}, {"status": "released"}, {"status": "completed"})
+            raise await completion_failure()
+        
+        if payment:
+            await record_payment_transition(payment, "released", session)
+        return completion
+    
+    updated = await run_in_transaction(confirm)
     
-    # If confirmed, release payment
+    parties = await request_parties(request_id)
     if confirmation_data.confirmed:
-        await db.payments.update_one(
-            {"service_request_id": request_id},
-            {"$set": {"status": "released", "updated_at": datetime.now(timezone.utc)}}
+        # The professional is the first party
+        await enqueue_notification(
+            parties[:1],
+            "payment.released",
+            "Se liberó el pago de tu servicio",
+            data={"service_request_id": request_id}
         )
     
-    updated = await db.service_completions.find_one({"service_request_id": request_id})
-    updated_clean = {k: v for k, v in updated.items() if k != "_id"}
+    await publish_event(
+        parties,
+        "service_completion.confirmed" if confirmation_data.confirmed else "service_completion.rejected",
+        updated
+    )
     
-    return updated_clean
+    return ORJSONResponse(updated)
 
 # Dispute routes
 @api_router.post("/disputes", response_model=Dispute)
@@ -974,27 +2874,38 @@ async def create_dispute(
     current_user: User = Depends(get_current_user)
 ):
     """Create a dispute for a service"""
-    # Get payment for this service
-    payment = await db.payments.find_one({"service_request_id": dispute_data.service_request_id})
-    if not payment:
-        raise HTTPException(status_code=404, detail="Payment not found")
-    
-    dispute = Dispute(
-        service_request_id=dispute_data.service_request_id,
-        payment_id=payment["id"],
-        reported_by=current_user.id,
-        reporter_type=current_user.user_type,
-        reason=dispute_data.reason,
-        description=dispute_data.description,
-        status="open"
-    )
-    
-    await db.disputes.insert_one(dispute.dict())
+    query = {"service_request_id": dispute_data.service_request_id}
     
-    # Update payment status
-    await db.payments.update_one(
-        {"id": payment["id"]},
-        {"$set": {"status": "in_dispute", "updated_at": datetime.now(timezone.utc)}}
+    async def open_dispute(session):
+        # Hold the payment and record the dispute together
+        payment = await apply_transition(
+            "payments", query, status_precondition("payment", "in_dispute"), {"status": "in_dispute"},
+            projection=LEDGER_PAYMENT_FIELDS, session=session, return_document=ReturnDocument.BEFORE
+        )
+        if not payment:
+            raise await transition_failure("payments", query, "Payment not found", "Payment cannot be disputed")
+        await record_payment_transition(payment, "in_dispute", session)
+        
+        dispute = Dispute(
+            service_request_id=dispute_data.service_request_id,
+            payment_id=payment["id"],
+            reported_by=current_user.id,
+            reporter_type=current_user.user_type,
+            reason=dispute_data.reason,
+            description=dispute_data.description,
+            status="open"
+        )
+        await db.disputes.insert_one(dispute.dict(), session=session)
+        return payment, dispute
+    
+    payment, dispute = await run_in_transaction(open_dispute)
+    await publish_event([payment["professional_id"], payment["company_id"]], "dispute.created", dispute.dict())
+    await enqueue_notification(
+        [p for p in (payment["professional_id"], payment["company_id"]) if p != current_user.id],
+        "dispute.created",
+        "Se abrió una disputa sobre tu servicio",
+        dispute.description,
+        {"service_request_id": dispute.service_request_id, "dispute_id": dispute.id}
     )
     
     return dispute
@@ -1002,35 +2913,712 @@ async def create_dispute(
 @api_router.get("/disputes")
 async def get_disputes(current_user: User = Depends(get_current_user)):
     """Get disputes (for admin/support)"""
-    disputes = await db.disputes.find().to_list(100)
-    disputes_clean = [{k: v for k, v in d.items() if k != "_id"} for d in disputes]
-    return disputes_clean
+    disputes = await db.disputes.find({}, NO_ID).to_list(100)
+    return ORJSONResponse(disputes)
 
 @api_router.get("/disputes/my-requests")
 async def get_my_request_disputes(current_user: User = Depends(get_current_user)):
     """Get disputes related to user's service requests"""
     # Get all service requests involving this user
     if current_user.user_type == "professional":
-        requests = await db.service_requests.find({"professional_id": current_user.id}).to_list(100)
+        requests = await db.service_requests.find({"professional_id": current_user.id}, {"id": 1}).to_list(100)
     else:
-        requests = await db.service_requests.find({"company_id": current_user.id}).to_list(100)
+        requests = await db.service_requests.find({"company_id": current_user.id}, {"id": 1}).to_list(100)
     
     request_ids = [r["id"] for r in requests]
     
-    disputes = await db.disputes.find({"service_request_id": {"$in": request_ids}}).to_list(100)
-    disputes_clean = [{k: v for k, v in d.items() if k != "_id"} for d in disputes]
+    disputes = await db.disputes.find({"service_request_id": {"$in": request_ids}}, NO_ID).to_list(100)
     
-    return disputes_clean
+    return ORJSONResponse(disputes)
+
+# Messaging routes
+# Messages are stored MESSAGE_BUCKET_SIZE to a document, bucketed by sequence number so each
+# bucket covers one contiguous stretch of the conversation (first_at..last_at)
+MESSAGE_BUCKET_SIZE = int(os.environ.get('MESSAGE_BUCKET_SIZE', '100'))
+MESSAGE_PREVIEW_LENGTH = 120
+
+@api_router.post("/conversations")
+async def create_conversation(
+    conversation_data: ConversationCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Open (or reopen) the conversation between a company and a professional"""
+    other = await db.users.find_one({"id": conversation_data.participant_id}, {"id": 1, "user_type": 1})
+    if not other:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    user_types = {current_user.user_type: current_user.id, other["user_type"]: other["id"]}
+    if set(user_types) != {"company", "professional"}:
+        raise HTTPException(
+            status_code=400,
+            detail="Conversations are between a company and a professional"
+        )
+    
+    conversation = Conversation(
+        company_id=user_types["company"],
+        professional_id=user_types["professional"],
+        participants=[user_types["company"], user_types["professional"]]
+    )
+    # The unique (company_id, professional_id) index makes this get-or-create
+    existing = await db.conversations.find_one_and_update(
+        {"company_id": conversation.company_id, "professional_id": conversation.professional_id},
+        {"$setOnInsert": conversation.dict()},
+        projection=NO_ID,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return ORJSONResponse(existing)
+
+@api_router.get("/conversations")
+async def get_conversations(
+    limit: int = Query(50, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Conversations of the current user, most recently active first"""
+    conversations = await db.conversations.find(
+        {"participants": current_user.id}, NO_ID
+    ).sort("updated_at", -1).to_list(limit)
+    return ORJSONResponse(conversations)
+
+@api_router.post("/conversations/{conversation_id}/messages", response_model=Message)
+async def send_message(
+    conversation_id: str,
+    message_data: MessageCreate,
+    current_user: User = Depends(get_current_user)
+):
+    now = datetime.now(timezone.utc)
+    recipient_side = "professional" if current_user.user_type == "company" else "company"
+    # Allocate the sequence number and bump the recipient's unread counter in one write
+    conversation = await db.conversations.find_one_and_update(
+        {"id": conversation_id, "participants": current_user.id},
+        {"$inc": {"message_count": 1, f"unread.{recipient_side}": 1}, "$set": {
+            "last_message": message_data.body[:MESSAGE_PREVIEW_LENGTH],
+            "last_message_at": now,
+            "updated_at": now
+        }},
+        projection={"participants": 1, "message_count": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    recipients = [p for p in conversation["participants"] if p != current_user.id]
+    message = Message(
+        conversation_id=conversation_id,
+        seq=conversation["message_count"],
+        sender_id=current_user.id,
+        body=message_data.body,
+        created_at=now
+    )
+    await db.message_buckets.update_one(
+        {"conversation_id": conversation_id, "bucket": (message.seq - 1) // MESSAGE_BUCKET_SIZE},
+        {
+            "$push": {"messages": message.dict(exclude={"conversation_id"})},
+            "$inc": {"count": 1},
+            "$min": {"first_at": now},
+            "$max": {"last_at": now},
+            "$setOnInsert": {"participants": conversation["participants"]}
+        },
+        upsert=True
+    )
+    await publish_event(recipients, "message.created", message.dict())
+    return message
+
+@api_router.get("/conversations/{conversation_id}/messages")
+async def get_messages(
+    conversation_id: str,
+    before: Optional[int] = Query(None, ge=2),
+    limit: int = Query(50, ge=1, le=MESSAGE_BUCKET_SIZE),
+    current_user: User = Depends(get_current_user)
+):
+    """Page backwards through history: the `limit` messages preceding sequence number `before`"""
+    query = {"conversation_id": conversation_id, "participants": current_user.id}
+    if before:
+        end = before - 1
+        start = max(end - limit + 1, 1)
+        query["bucket"] = {
+            "$gte": (start - 1) // MESSAGE_BUCKET_SIZE,
+            "$lte": (end - 1) // MESSAGE_BUCKET_SIZE
+        }
+        buckets = db.message_buckets.find(query, {"messages": 1})
+    else:
+        # Latest page: at most two newest buckets cover any limit up to the bucket size
+        buckets = db.message_buckets.find(query, {"messages": 1}).sort("bucket", -1).limit(2)
+    
+    messages = [message async for bucket in buckets for message in bucket["messages"]]
+    if before:
+        messages = [m for m in messages if start <= m["seq"] <= end]
+    messages.sort(key=lambda m: m["seq"])
+    messages = messages[-limit:]
+    
+    for message in messages:
+        message["conversation_id"] = conversation_id
+    next_before = messages[0]["seq"] if messages and messages[0]["seq"] > 1 else None
+    return ORJSONResponse({"messages": messages, "next_before": next_before})
+
+@api_router.post("/conversations/{conversation_id}/read")
+async def mark_conversation_read(
+    conversation_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    result = await db.conversations.update_one(
+        {"id": conversation_id, "participants": current_user.id},
+        {"$set": {f"unread.{current_user.user_type}": 0}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"conversation_id": conversation_id, "unread": 0}
+
+# Notification routes
+async def unread_notification_count(user_id: str) -> int:
+    counter = await db.notification_counters.find_one({"user_id": user_id}, {"unread": 1})
+    return max(counter["unread"], 0) if counter else 0
+
+@api_router.get("/notifications")
+async def get_notifications(
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Newest notifications first, paginated with an opaque keyset cursor"""
+    query = {"user_id": current_user.id}
+    if after:
+        last_created_at, last_id = decode_timeline_cursor(after)
+        query["$or"] = [
+            {"created_at": {"$lt": last_created_at}},
+            {"created_at": last_created_at, "id": {"$lt": last_id}}
+        ]
+    
+    notifications, unread_count = await asyncio.gather(
+        db.notifications.find(query, NO_ID).sort([("created_at", -1), ("id", -1)]).to_list(limit + 1),
+        unread_notification_count(current_user.id)
+    )
+    next_cursor = None
+    if len(notifications) > limit:
+        notifications = notifications[:limit]
+        next_cursor = encode_timeline_cursor(notifications[-1])
+    
+    return ORJSONResponse({
+        "notifications": notifications,
+        "unread_count": unread_count,
+        "next_cursor": next_cursor
+    })
+
+@api_router.get("/notifications/unread-count")
+async def get_unread_notification_count(current_user: User = Depends(get_current_user)):
+    return {"unread_count": await unread_notification_count(current_user.id)}
+
+@api_router.post("/notifications/read-all")
+async def mark_all_notifications_read(current_user: User = Depends(get_current_user)):
+    now = datetime.now(timezone.utc)
+    result = await db.notifications.update_many(
+        {"user_id": current_user.id, "read": False},
+        {"$set": {"read": True, "expires_at": now + timedelta(days=NOTIFICATION_READ_RETENTION_DAYS)}}
+    )
+    # Decrement by what was actually marked so notifications written meanwhile stay counted
+    if result.modified_count:
+        await db.notification_counters.update_one(
+            {"user_id": current_user.id},
+            {"$inc": {"unread": -result.modified_count}}
+        )
+    return {"marked_read": result.modified_count}
+
+@api_router.post("/notifications/{notification_id}/read")
+async def mark_notification_read(
+    notification_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    now = datetime.now(timezone.utc)
+    result = await db.notifications.update_one(
+        {"id": notification_id, "user_id": current_user.id, "read": False},
+        {"$set": {"read": True, "expires_at": now + timedelta(days=NOTIFICATION_READ_RETENTION_DAYS)}}
+    )
+    if result.modified_count:
+        await db.notification_counters.update_one(
+            {"user_id": current_user.id},
+            {"$inc": {"unread": -1}}
+        )
+    return {"id": notification_id, "read": True}
+
+# Event stream route
+@api_router.get("/events/stream")
+async def stream_events(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    """Server-sent events for the authenticated user's service requests.
+    EventSource cannot set headers, so the JWT may also be passed as ?token="""
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise credentials_exception()
+    current_user = await load_principal(decode_token_subject(raw_token))
+    queue = event_hub.subscribe(current_user.id)
+    
+    async def frames():
+        try:
+            yield b"retry: 5000\n\n"
+            # Starlette cancels this generator when the client disconnects
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment frame keeps proxies from closing idle connections
+                    yield b": ping\n\n"
+        finally:
+            event_hub.unsubscribe(current_user.id, queue)
+    
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Dashboard routes: each page's queries run concurrently, a slow one degrades to a partial result
+DASHBOARD_QUERY_TIMEOUT_SECONDS = float(os.environ.get('DASHBOARD_QUERY_TIMEOUT_SECONDS', '2'))
+DASHBOARD_LIST_SIZE = 5
+
+async def gather_dashboard(**queries) -> dict:
+    results = await asyncio.gather(
+        *(asyncio.wait_for(query, DASHBOARD_QUERY_TIMEOUT_SECONDS) for query in queries.values()),
+        return_exceptions=True
+    )
+    dashboard = {"unavailable": []}
+    for name, result in zip(queries, results):
+        if isinstance(result, Exception):
+            logger.warning("Dashboard query %s failed: %r", name, result)
+            dashboard[name] = None
+            dashboard["unavailable"].append(name)
+        else:
+            dashboard[name] = result
+    return dashboard
+
+async def top_professionals(limit: int) -> List[dict]:
+    pipeline = [
+        {"$sort": {"average_rating": -1, "id": -1}},
+        {"$limit": limit},
+    ] + USER_JOIN_STAGES + MERGE_USER_STAGES
+    return await db.professionals.aggregate(pipeline).to_list(limit)
+
+async def review_slice(query: dict) -> dict:
+    count, recent = await asyncio.gather(
+        db.reviews.count_documents(query),
+        db.reviews.find(query, PUBLIC_REVIEW).sort("created_at", -1).to_list(DASHBOARD_LIST_SIZE)
+    )
+    return {"count": count, "recent": recent}
+
+@api_router.get("/dashboard/company")
+async def get_company_dashboard(current_user: User = Depends(get_current_user)):
+    """Everything the company dashboard renders, fetched concurrently"""
+    if current_user.user_type != "company":
+        raise HTTPException(status_code=403, detail="Only companies can view the company dashboard")
+    
+    async def profile():
+        return merge_profile(current_user.dict(), await find_profile(current_user.id, current_user.user_type))
+    
+    async def professionals():
+        count, top = await asyncio.gather(
+            db.professionals.estimated_document_count(),
+            top_professionals(DASHBOARD_LIST_SIZE)
+        )
+        return {"count": count, "top": top}
+    
+    dashboard = await gather_dashboard(
+        profile=profile(),
+        professionals=professionals(),
+        reviews=review_slice({"reviewer_user_id": current_user.id}),
+        service_requests=db.service_requests.find(
+            {"company_id": current_user.id}, NO_ID
+        ).sort("created_at", -1).to_list(100)
+    )
+    return ORJSONResponse(dashboard)
+
+@api_router.get("/dashboard/professional")
+async def get_professional_dashboard(current_user: User = Depends(get_current_user)):
+    """Everything the professional dashboard renders, fetched concurrently"""
+    if current_user.user_type != "professional":
+        raise HTTPException(status_code=403, detail="Only professionals can view the professional dashboard")
+    
+    async def profile():
+        return merge_profile(current_user.dict(), await find_profile(current_user.id, current_user.user_type))
+    
+    dashboard = await gather_dashboard(
+        profile=profile(),
+        reviews=get_review_summary(current_user.id),
+        service_requests=db.service_requests.find(
+            {"professional_id": current_user.id}, NO_ID
+        ).sort("created_at", -1).to_list(100)
+    )
+    return ORJSONResponse(dashboard)
+
+# Match request routes
+@api_router.post("/match-requests")
+async def create_match_request(
+    request_data: MatchRequestCreate,
+    top_k: int = Query(10, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    """Company describes a procedure and gets the best matching professionals"""
+    if current_user.user_type != "company":
+        raise HTTPException(status_code=403, detail="Only companies can create match requests")
+    
+    match_request = MatchRequest(requester_user_id=current_user.id, **request_data.dict())
+    await db.match_requests.insert_one(match_request.dict())
+    
+    ranked = match_engine.rank(request_data, top_k)
+    scores = dict(ranked)
+    matches = await fetch_professionals_by_user_ids([user_id for user_id, _ in ranked])
+    for professional in matches:
+        professional["match_score"] = round(scores[professional["user_id"]], 4)
+    
+    return {"match_request": match_request, "matches": matches}
+
+# Export routes: full-history NDJSON/CSV streamed straight from Motor cursors
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+
+# parties maps a user type to the field scoping its own rows; datasets without parties are admin-only
+EXPORT_DATASETS = {
+    "reviews": {
+        "collection": "reviews", "model": Review, "date_field": "created_at", "parties": {},
+        "projection": PUBLIC_REVIEW,
+    },
+    "status-checks": {"collection": "status_checks", "model": StatusCheck, "date_field": "timestamp", "parties": {}},
+    "disputes": {"collection": "disputes", "model": Dispute, "date_field": "created_at", "parties": {}},
+    "service-requests": {
+        "collection": "service_requests", "model": ServiceRequest, "date_field": "created_at",
+        "parties": {"professional": "professional_id", "company": "company_id"},
+    },
+    "payments": {
+        "collection": "payments", "model": Payment, "date_field": "created_at",
+        "parties": {"professional": "professional_id", "company": "company_id"},
+    },
+    "payment-ledger": {
+        "collection": "payment_ledger", "model": LedgerEntry, "date_field": "created_at",
+        "parties": {"professional": "professional_id", "company": "company_id"},
+    },
+}
+
+def csv_cell(value):
+    # Lists of strings use the same pipe separator the bulk importer reads
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return CSV_LIST_SEPARATOR.join(value)
+    if isinstance(value, (list, dict)):
+        return orjson.dumps(value).decode()
+    return value
+
+def encode_export_rows(documents: List[dict], file_format: str, columns: List[str]) -> bytes:
+    if file_format == "ndjson":
+        return b"".join(orjson.dumps(document) + b"\n" for document in documents)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([csv_cell(document.get(column)) for column in columns] for document in documents)
+    return buffer.getvalue().encode()
+
+async def stream_export(cursor, file_format: str, columns: List[str]):
+    """Encode one cursor batch at a time so memory stays flat however long the export runs"""
+    if file_format == "csv":
+        yield encode_export_rows([dict(zip(columns, columns))], "csv", columns)
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield encode_export_rows(batch, file_format, columns)
+            batch = []
+    if batch:
+        yield encode_export_rows(batch, file_format, columns)
+
+@api_router.get("/export/{dataset}")
+async def export_dataset(
+    dataset: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Stream every matching row, oldest first; admins export everything, parties their own rows"""
+    spec = EXPORT_DATASETS.get(dataset)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Unknown export dataset")
+    
+    query = {}
+    if current_user.email.lower() not in ADMIN_EMAILS:
+        party_field = spec["parties"].get(current_user.user_type)
+        if party_field is None:
+            raise HTTPException(status_code=403, detail="Not allowed to export this dataset")
+        query[party_field] = current_user.id
+    
+    date_field = spec["date_field"]
+    if since or until:
+        query[date_field] = {}
+        if since:
+            query[date_field]["$gte"] = since
+        if until:
+            query[date_field]["$lt"] = until
+    
+    cursor = db[spec["collection"]].find(query, spec.get("projection", NO_ID)).sort(date_field, 1).batch_size(EXPORT_BATCH_SIZE)
+    columns = list(spec["model"].model_fields)
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"{dataset}-{datetime.now(timezone.utc):%Y%m%d}.{format}"
+    return StreamingResponse(
+        stream_export(cursor, format, columns),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Admission control: token buckets per JWT subject and per IP, per-group concurrency caps,
+# and load shedding once Mongo latency passes its threshold.
+# rate is tokens per second, burst the bucket size; a None limit disables that check.
+# Event streams hold their connection for the whole session, so only connection attempts are limited.
+# Per-IP limits are sized for a hospital's staff sharing one NAT address; the per-subject buckets
+# are what hold back any single account.
+ROUTE_GROUP_LIMITS = {
+    "auth": {"subject_rate": None, "subject_burst": None, "ip_rate": 5.0, "ip_burst": 50, "concurrency": 32, "shed": False},
+    "bulk": {"subject_rate": 0.05, "subject_burst": 2, "ip_rate": 0.1, "ip_burst": 4, "concurrency": 4, "shed": True},
+    "stream": {"subject_rate": 0.2, "subject_burst": 5, "ip_rate": 2.0, "ip_burst": 50, "concurrency": None, "shed": False},
+    "search": {"subject_rate": 5.0, "subject_burst": 20, "ip_rate": 10.0, "ip_burst": 40, "concurrency": 64, "shed": True},
+    "default": {"subject_rate": 10.0, "subject_burst": 40, "ip_rate": 50.0, "ip_burst": 200, "concurrency": 256, "shed": True},
+}
+# Per-group overrides as JSON, e.g. RATE_LIMITS='{"search": {"concurrency": 32}}'
+for group, overrides in json.loads(os.environ.get('RATE_LIMITS', '{}')).items():
+    ROUTE_GROUP_LIMITS.setdefault(group, dict(ROUTE_GROUP_LIMITS["default"])).update(overrides)
+
+# First matching prefix wins
+ROUTE_GROUPS = [
+    ("/api/auth/", "auth"),
+    ("/api/admin/", "bulk"),
+    ("/api/export/", "bulk"),
+    ("/api/events/", "stream"),
+    ("/api/professionals", "search"),
+    ("/api/match-requests", "search"),
+    ("/api/", "default"),
+]
+MONGO_LATENCY_SHED_MS = float(os.environ.get('MONGO_LATENCY_SHED_MS', '250'))
+# Number of proxies in front of the app; the client address is read from X-Forwarded-For that many
+# entries from the right, since entries further left are supplied by the client and can be forged.
+# Set it to 0 when clients connect directly. Left unset, per-IP buckets are skipped: behind an
+# ingress every request would come from the proxy's address and all users would share one bucket.
+RATE_LIMIT_TRUSTED_PROXIES = (
+    int(os.environ['RATE_LIMIT_TRUSTED_PROXIES']) if os.environ.get('RATE_LIMIT_TRUSTED_PROXIES') else None
+)
+RATE_LIMIT_MAX_KEYS = 100000
+
+class TokenBuckets:
+    """Token buckets keyed by principal, least recently used keys evicted past maxsize"""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+    
+    def take(self, key, rate: float, burst: float) -> float:
+        """Spend one token; returns 0 on success or the seconds until a token is available"""
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            retry_after = 0.0
+        else:
+            self._buckets[key] = (tokens, now)
+            retry_after = (1 - tokens) / rate
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+def route_group(path: str) -> Optional[str]:
+    for prefix, group in ROUTE_GROUPS:
+        if path.startswith(prefix):
+            return group
+    return None
+
+def request_subject(headers: dict) -> Optional[str]:
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+def client_ip(scope, headers: dict) -> Optional[str]:
+    """The address to rate limit, or None when the deployment has not said where it comes from"""
+    if RATE_LIMIT_TRUSTED_PROXIES is None:
+        return None
+    if RATE_LIMIT_TRUSTED_PROXIES and b"x-forwarded-for" in headers:
+        hops = [hop.strip() for hop in headers[b"x-forwarded-for"].decode("latin-1").split(",")]
+        return hops[-min(RATE_LIMIT_TRUSTED_PROXIES, len(hops))]
+    return scope["client"][0] if scope.get("client") else "unknown"
+
+def shed_probability(latency_ms: float) -> float:
+    # Nothing below the threshold, then linearly up to shedding everything at twice the threshold
+    if latency_ms <= MONGO_LATENCY_SHED_MS:
+        return 0.0
+    return min(1.0, (latency_ms - MONGO_LATENCY_SHED_MS) / MONGO_LATENCY_SHED_MS)
+
+class AdmissionControlMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.buckets = TokenBuckets(RATE_LIMIT_MAX_KEYS)
+        self.in_flight = {group: 0 for group in ROUTE_GROUP_LIMITS}
+    
+    async def reject(self, send, status_code: int, detail: str, retry_after: float):
+        response = ORJSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await send({"type": "http.response.start", "status": response.status_code, "headers": response.raw_headers})
+        await send({"type": "http.response.body", "body": response.body})
+    
+    async def __call__(self, scope, receive, send):
+        group = route_group(scope["path"]) if scope["type"] == "http" else None
+        if group is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        limits = ROUTE_GROUP_LIMITS[group]
+        
+        if limits["shed"] and random.random() < shed_probability(mongo_latency.latency_ms()):
+            ADMISSION_REJECTIONS.labels(group, "shed").inc()
+            await self.reject(send, 503, "Server overloaded, retry shortly", 1)
+            return
+        
+        headers = dict(scope["headers"])
+        ip = client_ip(scope, headers)
+        checks = [(("ip", ip), limits["ip_rate"], limits["ip_burst"])] if ip else []
+        subject = request_subject(headers) if limits["subject_rate"] else None
+        if subject:
+            checks.append((("sub", subject), limits["subject_rate"], limits["subject_burst"]))
+        for key, rate, burst in checks:
+            if rate is None:
+                continue
+            retry_after = self.buckets.take((group, *key), rate, burst)
+            if retry_after:
+                ADMISSION_REJECTIONS.labels(group, f"{key[0]}_rate").inc()
+                await self.reject(send, 429, "Too many requests", retry_after)
+                return
+        
+        if limits["concurrency"] is None:
+            await self.app(scope, receive, send)
+            return
+        if self.in_flight[group] >= limits["concurrency"]:
+            ADMISSION_REJECTIONS.labels(group, "concurrency").inc()
+            await self.reject(send, 503, "Too many concurrent requests", 1)
+            return
+        self.in_flight[group] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight[group] -= 1
+
+app.add_middleware(AdmissionControlMiddleware)
+
+class MetricsMiddleware:
+    """Outside admission control, so shed and rate-limited requests are counted too"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        group = route_group(scope["path"]) if scope["type"] == "http" else None
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        in_flight = HTTP_IN_FLIGHT.labels(group)
+        in_flight.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            # The router stores the matched route in the scope; label by template to bound cardinality
+            route = scope["route"].path if "route" in scope else "unmatched"
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route).observe(time.perf_counter() - started_at)
+            HTTP_REQUESTS.labels(scope["method"], route, str(status_code)).inc()
+
+app.add_middleware(MetricsMiddleware)
+
+def query_budget_error(scope, stats: RequestDbStats) -> Optional[str]:
+    route = scope["route"].path if "route" in scope else None
+    budget = QUERY_BUDGETS.get(route, QUERY_BUDGET)
+    if not QUERY_BUDGET_ENFORCED or budget is None or stats.commands <= budget:
+        return None
+    return f"{scope['method']} {route or scope['path']} issued {stats.commands} Mongo commands, budget is {budget}"
+
+class DbAccountingMiddleware:
+    """Report each request's Mongo usage in Server-Timing and one structured log line"""
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+        
+        stats = RequestDbStats()
+        token = request_db_stats.set(stats)
+        status_code = 500
+        
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                error = query_budget_error(scope, stats)
+                if error:
+                    raise AssertionError(error)
+                timing = f'db;dur={stats.duration_ms:.1f};desc="{stats.commands} queries, {stats.documents} docs"'
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+            # Streamed bodies keep querying after the headers are sent
+            error = query_budget_error(scope, stats)
+            if error:
+                raise AssertionError(error)
+        finally:
+            request_db_stats.reset(token)
+            repeated = stats.repeated_shapes()
+            record = {
+                "method": scope["method"],
+                "route": scope["route"].path if "route" in scope else scope["path"],
+                "status": status_code,
+                "db_commands": stats.commands,
+                "db_ms": round(stats.duration_ms, 1),
+                "db_documents": stats.documents,
+            }
+            if repeated:
+                record["repeated_shapes"] = repeated
+                db_logger.warning("Possible N+1 query pattern %s", json.dumps(record))
+            else:
+                db_logger.info(json.dumps(record))
+
+app.add_middleware(DbAccountingMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After", "Server-Timing"],
 )
 
 # Configure logging
@@ -1040,6 +3628,253 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Index registry: every collection's indexes, applied idempotently on startup
+INDEXES = {
+    "users": [
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("id", ASCENDING)]),
+    ],
+    "professionals": [
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("average_rating", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("specialties", ASCENDING), ("average_rating", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("location_point", "2dsphere")]),
+        IndexModel([("location_terms", ASCENDING), ("average_rating", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "companies": [IndexModel([("user_id", ASCENDING)])],
+    "suppliers": [IndexModel([("user_id", ASCENDING)])],
+    "reviews": [
+        IndexModel([("reviewed_user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("reviewer_user_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "service_requests": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("professional_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "payments": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("service_request_id", ASCENDING)]),
+        IndexModel([("professional_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "service_details": [IndexModel([("service_request_id", ASCENDING)])],
+    "service_completions": [
+        IndexModel([("service_request_id", ASCENDING)]),
+        IndexModel([("professional_id", ASCENDING)]),
+    ],
+    "disputes": [
+        IndexModel([("service_request_id", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "status_checks": [IndexModel([("timestamp", DESCENDING)])],
+    "match_requests": [IndexModel([("requester_user_id", ASCENDING), ("created_at", DESCENDING)])],
+    "conversations": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("professional_id", ASCENDING)], unique=True),
+        IndexModel([("participants", ASCENDING), ("updated_at", DESCENDING)]),
+    ],
+    "message_buckets": [IndexModel([("conversation_id", ASCENDING), ("bucket", DESCENDING)], unique=True)],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "notification_counters": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "review_summaries": [IndexModel([("user_id", ASCENDING)], unique=True)],
+    "jobs": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "payment_ledger": [
+        IndexModel([("payment_id", ASCENDING)]),
+        IndexModel([("professional_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("company_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+    "balances": [IndexModel([("owner_id", ASCENDING), ("owner_type", ASCENDING)], unique=True)],
+}
+
+# Hot queries whose plans must be index-backed: (collection, filter, sort)
+HOT_QUERIES = [
+    ("users", {"email": ""}, None),
+    ("users", {"id": ""}, None),
+    ("professionals", {"user_id": ""}, None),
+    ("professionals", {}, [("average_rating", DESCENDING), ("id", DESCENDING)]),
+    ("professionals", {"specialties": ""}, [("average_rating", DESCENDING), ("id", DESCENDING)]),
+    ("professionals", {"location_terms": {"$all": [""]}}, [("average_rating", DESCENDING), ("id", DESCENDING)]),
+    ("professionals", {"location_point": {"$nearSphere": {"$geometry": {"type": "Point", "coordinates": [-74.0721, 4.711]}}}}, None),
+    ("companies", {"user_id": ""}, None),
+    ("suppliers", {"user_id": ""}, None),
+    ("reviews", {"reviewed_user_id": ""}, [("created_at", DESCENDING)]),
+    ("reviews", {"reviewer_user_id": ""}, [("created_at", DESCENDING)]),
+    ("reviews", {}, [("created_at", DESCENDING)]),
+    ("service_requests", {"id": ""}, None),
+    ("service_requests", {"professional_id": ""}, [("created_at", DESCENDING)]),
+    ("service_requests", {"company_id": ""}, [("created_at", DESCENDING)]),
+    ("service_requests", {}, [("created_at", ASCENDING)]),
+    ("payments", {"service_request_id": ""}, None),
+    ("payments", {"professional_id": ""}, [("created_at", ASCENDING)]),
+    ("payments", {"company_id": ""}, [("created_at", ASCENDING)]),
+    ("payments", {}, [("created_at", ASCENDING)]),
+    ("service_details", {"service_request_id": ""}, None),
+    ("service_completions", {"service_request_id": ""}, None),
+    ("service_completions", {"professional_id": ""}, None),
+    ("disputes", {"service_request_id": {"$in": []}}, None),
+    ("disputes", {}, [("created_at", ASCENDING)]),
+    ("status_checks", {}, [("timestamp", ASCENDING)]),
+    ("conversations", {"participants": ""}, [("updated_at", DESCENDING)]),
+    ("message_buckets", {"conversation_id": "", "participants": ""}, [("bucket", DESCENDING)]),
+    ("notifications", {"user_id": ""}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("notification_counters", {"user_id": ""}, None),
+    ("review_summaries", {"user_id": ""}, None),
+    ("jobs", {"status": "queued", "run_at": {"$lte": 0}}, [("run_at", ASCENDING)]),
+    ("jobs", {"status": "running", "locked_until": {"$lte": 0}}, [("locked_until", ASCENDING)]),
+    ("payment_ledger", {"professional_id": ""}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("payment_ledger", {"company_id": ""}, [("created_at", DESCENDING), ("id", DESCENDING)]),
+    ("payment_ledger", {}, [("created_at", ASCENDING)]),
+    ("balances", {"owner_id": "", "owner_type": ""}, None),
+]
+
+async def duplicate_keys(collection: str, fields: List[str], sample: int = 20) -> List[dict]:
+    """Key values held by more than one document, which block a unique index"""
+    return await db[collection].aggregate([
+        {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$limit": sample},
+    ], allowDiskUse=True).to_list(sample)
+
+async def ensure_indexes() -> List[str]:
+    """Create every registered index. Failures are logged and returned rather than raised,
+    so data that predates a unique index (e.g. duplicate emails) cannot take down startup."""
+    failures = []
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+            continue
+        except OperationFailure:
+            pass
+        # One bad index fails the whole batch; retry individually so the others still get built
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                document = index.document
+                failure = f"Could not create index {document['name']} on {collection}: {e}"
+                if document.get("unique"):
+                    duplicates = await duplicate_keys(collection, list(document["key"]))
+                    failure += f"; conflicting keys: {[duplicate['_id'] for duplicate in duplicates]}"
+                logger.error(failure)
+                failures.append(failure)
+    return failures
+
+def plan_has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(plan_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(plan_has_collscan(value) for value in plan)
+    return False
+
+async def check_query_plans() -> List[str]:
+    """Explain every hot query and return the ones planned as a collection scan"""
+    failures = []
+    for collection, query, sort in HOT_QUERIES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        if plan_has_collscan(explanation.get("queryPlanner", {}).get("winningPlan")):
+            failures.append(f"{collection} {query} sort={sort}: COLLSCAN")
+    return failures
+
+@app.on_event("startup")
+async def startup_db_client():
+    await detect_transaction_support()
+    if RATE_LIMIT_TRUSTED_PROXIES is None:
+        logger.warning("RATE_LIMIT_TRUSTED_PROXIES is not set, per-IP rate limits are off")
+    await load_collection_versions()
+    event_hub.on("collection.versions", apply_collection_versions)
+    event_hub.on("review.created", add_recent_review)
+    event_hub.on("principal.invalidated", apply_principal_invalidation)
+    event_hub.on("professionals.updated", apply_professional_updates)
+    event_hub.on("professional.rated", apply_professional_rating)
+    event_hub.on("professionals.rebuild", schedule_professional_rebuild)
+    await event_hub.start()
+    global version_refresh_task
+    version_refresh_task = asyncio.create_task(version_refresh_loop())
+    await ensure_indexes()
+    await rebuild_professional_indexes()
+    start_job_workers()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    version_refresh_task.cancel()
+    await stop_job_workers()
+    await event_hub.close()
     client.close()
+    password_pool.shutdown(wait=False)
+
+# Maintenance commands: python server.py <command>
+async def run_command(command: str, **options) -> int:
+    if command == "ensure-indexes":
+        if await ensure_indexes():
+            return 1
+        logger.info("Indexes ensured")
+    elif command == "check-indexes":
+        failures = await check_query_plans()
+        for failure in failures:
+            logger.error(failure)
+        if failures:
+            return 1
+        logger.info("All %d hot queries are index-backed", len(HOT_QUERIES))
+    elif command == "reconcile-ratings":
+        await reconcile_user_ratings()
+        logger.info("Rating totals reconciled")
+    elif command == "rebuild-review-summaries":
+        await rebuild_review_summaries()
+        logger.info("Review summaries rebuilt")
+    elif command == "requeue-dead-jobs":
+        logger.info("Requeued %d dead-lettered jobs", await requeue_dead_jobs())
+    elif command == "backfill-locations":
+        await backfill_location_points()
+        logger.info("Location points backfilled")
+    elif command == "backfill-ledger":
+        await backfill_payment_ledger()
+        logger.info("Payment ledger backfilled and balances rebuilt")
+    elif command == "import-profiles":
+        lines = iter_text_lines(iter_file_chunks(options["path"]))
+        report = await import_profiles(lines, options["format"], options["user_type"])
+        for error in report.errors:
+            logger.error("Line %d: %s", error["line"], error["error"])
+        logger.info("Imported %d accounts, %d rows failed", report.imported, report.failed)
+        if report.failed:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IQX Professionals Platform maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("ensure-indexes", help="Create every index in the registry")
+    subparsers.add_parser("check-indexes", help="Fail if any hot query plan is a COLLSCAN")
+    subparsers.add_parser("reconcile-ratings", help="Recompute rating totals from all reviews")
+    subparsers.add_parser("rebuild-review-summaries", help="Recompute per-user review summaries from all reviews")
+    subparsers.add_parser("requeue-dead-jobs", help="Give dead-lettered background jobs a fresh set of attempts")
+    subparsers.add_parser("backfill-locations", help="Geocode existing users and copy location terms onto profiles")
+    subparsers.add_parser("backfill-ledger", help="Open ledger entries for old payments and add them to balances")
+    import_parser = subparsers.add_parser("import-profiles", help="Bulk import accounts from NDJSON or CSV")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    import_parser.add_argument("--user-type", choices=sorted(IMPORT_MODELS))
+    args = parser.parse_args()
+    try:
+        sys.exit(asyncio.run(run_command(**vars(args))))
+    finally:
+        client.close()
@@ -0,0 +1,103 @@
+"""Shared setup for the benchmarks: run the app in process against a throwaway database.
+
+Every script expects a reachable MongoDB (MONGO_URL, default mongodb://localhost:27017) and
+drops DB_NAME (default iqx_bench) before seeding, so never point it at real data.
+"""
+import json
+import os
+import re
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "iqx_bench")
+# Benchmarks drive far more traffic from one address than admission control allows
+os.environ.setdefault("RATE_LIMITS", json.dumps({
+    group: {"ip_rate": None, "subject_rate": None, "concurrency": 100000}
+    for group in ("auth", "bulk", "stream", "search", "default")
+}))
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+
+# One precomputed hash keeps seeding fast; the password only matters to the login benchmark
+BENCH_PASSWORD = "bench-password"
+BENCH_PASSWORD_HASH = server.get_password_hash(BENCH_PASSWORD)
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries')
+
+
+async def reset_database():
+    if "bench" not in server.db.name:
+        raise SystemExit(f"Refusing to drop {server.db.name!r}: DB_NAME must contain 'bench'")
+    await server.client.drop_database(server.db.name)
+    await server.ensure_indexes()
+
+
+def api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=None)
+
+
+def auth_headers(email: str) -> dict:
+    token = server.create_access_token({"sub": email}, timedelta(hours=12))
+    return {"Authorization": f"Bearer {token}"}
+
+
+def db_commands(response: httpx.Response) -> int:
+    """Mongo commands the request issued, as reported in its Server-Timing header"""
+    match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    return int(match.group(1)) if match else -1
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def seed_accounts(count: int, user_type: str, batch_size: int = 1000, **profile_fields) -> list:
+    """Insert `count` users with profiles directly, bypassing registration; returns the users"""
+    users = []
+    for start in range(0, count, batch_size):
+        user_documents, profiles = [], []
+        for i in range(start, min(start + batch_size, count)):
+            new_user, profile = server.build_account({
+                "email": f"{user_type}{i}@bench.example",
+                "user_type": user_type,
+                "full_name": f"{user_type.title()} {i}",
+                "phone": "3000000000",
+                "location": ["Bogotá", "Medellín", "Cali", "Barranquilla"][i % 4],
+                "specialties": [["Ortopedia", "Columna", "Cardiología", "Neurología"][i % 4]],
+                "company_name": f"Company {i}",
+                "company_type": "hospital",
+                **profile_fields,
+            })
+            if profile is not None and hasattr(profile, "average_rating"):
+                profile.average_rating = round((i * 37 % 50) / 10, 1)
+            user_documents.append({**new_user.dict(), "hashed_password": BENCH_PASSWORD_HASH})
+            profiles.append(profile.dict())
+            users.append(new_user)
+        await server.db.users.insert_many(user_documents, ordered=False)
+        await server.db[server.PROFILE_COLLECTIONS[user_type]].insert_many(profiles, ordered=False)
+    return users
+
+
+class Timer:
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started_at
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    for row in [headers, *rows]:
+        print("  ".join(str(cell).rjust(width) for cell, width in zip(row, widths)))
@@ -0,0 +1,64 @@
+"""Directory read benchmark: Mongo round trips and latency of GET /api/professionals.
+
+Compares the original per-profile find_one loop with the aggregation join at 100, 1k and 10k
+profiles. Round trips for the API come from the request's Server-Timing header; the original
+read is timed directly against Mongo, without HTTP overhead.
+
+    python bench/directory.py [--sizes 100 1000 10000] [--requests 200]
+"""
+import argparse
+import asyncio
+
+from common import Timer, api_client, db_commands, percentile, print_table, reset_database, seed_accounts, server
+
+
+async def original_directory_read():
+    # The handler before the aggregation join: one find for the page, one find_one per profile
+    commands = 1
+    professionals = await server.db.professionals.find().to_list(100)
+    result = []
+    for profile in professionals:
+        user = await server.db.users.find_one({"id": profile["user_id"]})
+        commands += 1
+        if user:
+            result.append({**{k: v for k, v in user.items() if k not in ("_id", "hashed_password")},
+                           **{k: v for k, v in profile.items() if k != "_id"}})
+    return commands
+
+
+async def measure(read, requests: int):
+    latencies, commands = [], 0
+    for _ in range(requests):
+        with Timer() as timer:
+            commands = await read()
+        latencies.append(timer.elapsed * 1000)
+    return commands, percentile(latencies, 50), percentile(latencies, 95)
+
+
+async def main(sizes, requests):
+    rows = []
+    async with api_client() as client:
+        async def api_read():
+            response = await client.get("/api/professionals", params={"limit": 100})
+            response.raise_for_status()
+            return db_commands(response)
+
+        for size in sizes:
+            await reset_database()
+            await seed_accounts(size, "professional")
+            for name, read in (("original", original_directory_read), ("aggregation", api_read)):
+                await read()  # warm up connections and caches
+                commands, p50, p95 = await measure(read, requests)
+                rows.append((size, name, commands, f"{p50:.1f}", f"{p95:.1f}"))
+    print_table(("profiles", "read", "round trips", "p50 ms", "p95 ms"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.sizes, args.requests))
+    finally:
+        server.client.close()
@@ -0,0 +1,82 @@
+"""Login benchmark: logins/sec and event-loop lag under concurrent POST /api/auth/login.
+
+Runs once with verification on the password pool and once inline on the event loop, which is
+how a slow KDF behaves without the pool. Loop lag is how late a 10 ms ticker wakes up.
+The hash cost follows PASSWORD_HASH_ITERATIONS, so export it to benchmark another setting.
+
+    python bench/logins.py [--users 50] [--concurrency 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import time
+
+from common import BENCH_PASSWORD, Timer, api_client, percentile, print_table, reset_database, seed_accounts, server
+
+TICK_SECONDS = 0.01
+
+
+async def measure_loop_lag(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+
+async def run_logins(users: list, concurrency: int, seconds: float):
+    latencies, lags = [], []
+    stop = asyncio.Event()
+    deadline = time.perf_counter() + seconds
+
+    async with api_client() as client:
+        async def login_loop(worker: int):
+            i = worker
+            while time.perf_counter() < deadline:
+                user = users[i % len(users)]
+                i += concurrency
+                with Timer() as timer:
+                    response = await client.post("/api/auth/login", json={"email": user.email, "password": BENCH_PASSWORD})
+                response.raise_for_status()
+                latencies.append(timer.elapsed * 1000)
+
+        ticker = asyncio.create_task(measure_loop_lag(lags, stop))
+        with Timer() as total:
+            await asyncio.gather(*(login_loop(worker) for worker in range(concurrency)))
+        stop.set()
+        await ticker
+    return len(latencies) / total.elapsed, latencies, lags
+
+
+async def main(user_count: int, concurrency: int, seconds: float):
+    await reset_database()
+    users = await seed_accounts(user_count, "professional")
+
+    async def verify_inline(plain_password, hashed_password):
+        return server.verify_password(plain_password, hashed_password)
+
+    pooled = server.verify_password_async
+    rows = []
+    for mode, verify in (("pool", pooled), ("inline", verify_inline)):
+        server.verify_password_async = verify
+        server.principal_cache._entries.clear()
+        rate, latencies, lags = await run_logins(users, concurrency, seconds)
+        rows.append((
+            mode, f"{rate:.1f}", f"{percentile(latencies, 50):.0f}", f"{percentile(latencies, 95):.0f}",
+            f"{percentile(lags, 50):.1f}", f"{percentile(lags, 99):.1f}", f"{max(lags, default=0):.1f}"
+        ))
+    server.verify_password_async = pooled
+
+    print(f"PBKDF2 iterations: {server.PASSWORD_HASH_ITERATIONS}, pool workers: {server.password_pool._max_workers}")
+    print_table(("verify", "logins/s", "p50 ms", "p95 ms", "lag p50 ms", "lag p99 ms", "lag max ms"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.users, args.concurrency, args.seconds))
+    finally:
+        server.client.close()
+        server.password_pool.shutdown(wait=False)
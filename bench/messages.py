@@ -0,0 +1,105 @@
+"""Messaging load test: a million messages through the API, then history reads at depth.
+
+Sends --messages messages spread over --conversations company/professional pairs with
+--concurrency concurrent senders. Reports send throughput and latency, bucket documents versus
+messages stored, and read latency and round trips for the latest page and for pages deep in
+history (reached through the `before` cursor).
+
+    python bench/messages.py [--messages 1000000] [--conversations 1000] [--concurrency 64]
+"""
+import argparse
+import asyncio
+import random
+
+from common import (
+    Timer, api_client, auth_headers, db_commands, percentile, print_table, reset_database, seed_accounts, server
+)
+
+
+async def open_conversations(client, count: int) -> list:
+    companies = await seed_accounts(count, "company")
+    professionals = await seed_accounts(count, "professional")
+    conversations = []
+    for company, professional in zip(companies, professionals):
+        headers = {"company": auth_headers(company.email), "professional": auth_headers(professional.email)}
+        response = await client.post("/api/conversations", json={"participant_id": professional.id}, headers=headers["company"])
+        response.raise_for_status()
+        conversations.append((response.json()["id"], headers))
+    return conversations
+
+
+async def send_messages(client, conversations: list, total: int, concurrency: int):
+    latencies = []
+    counter = iter(range(total))
+
+    async def sender():
+        for i in counter:
+            conversation_id, headers = conversations[i % len(conversations)]
+            side = "company" if i % 2 else "professional"
+            with Timer() as timer:
+                response = await client.post(
+                    f"/api/conversations/{conversation_id}/messages",
+                    json={"body": f"Mensaje {i}: confirmo disponibilidad para el procedimiento."},
+                    headers=headers[side]
+                )
+            response.raise_for_status()
+            latencies.append(timer.elapsed * 1000)
+            if len(latencies) % 100000 == 0:
+                print(f"  {len(latencies)} messages sent")
+
+    with Timer() as elapsed:
+        await asyncio.gather(*(sender() for _ in range(concurrency)))
+    return total / elapsed.elapsed, latencies
+
+
+async def read_history(client, conversations: list, samples: int, depth_pages: int):
+    """Latest page, then the page reached after walking `depth_pages` pages back"""
+    latest, deep = [], []
+    for conversation_id, headers in random.sample(conversations, min(samples, len(conversations))):
+        url = f"/api/conversations/{conversation_id}/messages"
+        with Timer() as timer:
+            response = await client.get(url, headers=headers["company"])
+        latest.append((timer.elapsed * 1000, db_commands(response)))
+        before = response.json()["next_before"]
+        for _ in range(depth_pages):
+            if before is None:
+                break
+            with Timer() as timer:
+                response = await client.get(url, params={"before": before}, headers=headers["company"])
+            before = response.json()["next_before"]
+        deep.append((timer.elapsed * 1000, db_commands(response)))
+    return latest, deep
+
+
+async def main(messages: int, conversation_count: int, concurrency: int, samples: int):
+    await reset_database()
+    await server.event_hub.start()
+    async with api_client() as client:
+        conversations = await open_conversations(client, conversation_count)
+        rate, send_latencies = await send_messages(client, conversations, messages, concurrency)
+        buckets = await server.db.message_buckets.estimated_document_count()
+        per_conversation = messages // conversation_count
+        latest, deep = await read_history(client, conversations, samples, depth_pages=per_conversation // 50 - 1)
+
+    print(f"sent {messages} messages at {rate:.0f}/s, p50 {percentile(send_latencies, 50):.1f} ms, "
+          f"p95 {percentile(send_latencies, 95):.1f} ms")
+    print(f"stored in {buckets} bucket documents ({messages / max(buckets, 1):.0f} messages per document)")
+    rows = [
+        (name, f"{percentile([ms for ms, _ in reads], 50):.1f}", f"{percentile([ms for ms, _ in reads], 95):.1f}",
+         max(commands for _, commands in reads))
+        for name, reads in (("latest page", latest), ("deepest page", deep))
+    ]
+    print_table(("history read", "p50 ms", "p95 ms", "max round trips"), rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--conversations", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--samples", type=int, default=50, help="conversations whose history is read")
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.messages, args.conversations, args.concurrency, args.samples))
+    finally:
+        server.client.close()
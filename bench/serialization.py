@@ -0,0 +1,113 @@
+"""Per-request CPU and allocation microbenchmark for the read path, before and after projections.
+
+Before: whole documents come back, `_id`/`hashed_password` are stripped into a copy, every row is
+re-validated through its pydantic model and FastAPI's encoder serializes the result. After: Mongo
+projects the fields away and the documents go straight to orjson. Needs no database; the
+documents are synthetic and sized like real rows.
+
+    python bench/serialization.py [--requests 500]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId
+
+from common import print_table, server
+
+
+def review_document(i: int) -> dict:
+    return {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "reviewed_user_id": str(uuid.uuid4()),
+        "reviewer_user_id": str(uuid.uuid4()), "reviewer_name": f"Reviewer {i}", "reviewer_type": "company",
+        "rating": i % 5 + 1, "comment": "Excelente trabajo en la cirugía, muy puntual y profesional. " * 2,
+        "collaboration_type": "surgery", "date_of_service": None, "created_at": datetime.now(timezone.utc),
+    }
+
+
+def directory_document(i: int) -> tuple:
+    user = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "email": f"pro{i}@example.com", "user_type": "professional",
+        "full_name": f"Profesional {i}", "phone": "3001234567", "location": "Bogotá", "profile_image": None,
+        "hashed_password": server.DUMMY_PASSWORD_HASH,
+        "created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc),
+    }
+    profile = {
+        "_id": ObjectId(), "id": str(uuid.uuid4()), "user_id": user["id"], "specialties": ["Ortopedia", "Columna"],
+        "experience_years": 12, "bio": "Instrumentadora quirúrgica con experiencia en columna. " * 3,
+        "education": "Universidad Nacional", "certifications": ["ACLS"], "average_rating": 4.5,
+        "total_reviews": 20, "hourly_rate": 80000.0, "availability_status": "available",
+        "skills": ["instrumentación"], "areas_of_expertise": ["columna"],
+        "created_at": datetime.now(timezone.utc), "updated_at": datetime.now(timezone.utc),
+    }
+    return user, profile
+
+
+def reviews_before(documents):
+    reviews = [server.Review(**{k: v for k, v in d.items() if k != "_id"}) for d in documents]
+    return json.dumps(server.jsonable_encoder(reviews)).encode()
+
+
+def directory_before(pairs):
+    result = []
+    for user, profile in pairs:
+        user_data = {k: v for k, v in user.items() if k not in ("_id", "hashed_password")}
+        profile_data = {k: v for k, v in profile.items() if k != "_id"}
+        result.append({**user_data, **server.Professional(**profile_data).dict()})
+    return json.dumps(server.jsonable_encoder(result)).encode()
+
+
+def orjson_after(documents):
+    return server.orjson.dumps(documents)
+
+
+def measure(render, payload, requests: int):
+    render(payload)
+    started = time.process_time()
+    for _ in range(requests):
+        render(payload)
+    cpu_ms = (time.process_time() - started) * 1000 / requests
+
+    tracemalloc.start()
+    render(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cpu_ms, peak / 1024
+
+
+def main(requests: int):
+    reviews = [review_document(i) for i in range(100)]
+    projected_reviews = [{k: v for k, v in d.items() if k != "_id"} for d in reviews]
+    pairs = [directory_document(i) for i in range(100)]
+    projected_directory = [
+        {**{k: v for k, v in u.items() if k not in ("_id", "hashed_password")}, **{k: v for k, v in p.items() if k != "_id"}}
+        for u, p in pairs
+    ]
+    wire_before = sum(len(bson.encode(u)) + len(bson.encode(p)) for u, p in pairs)
+    wire_after = sum(len(bson.encode(d)) for d in projected_directory)
+
+    rows = []
+    for name, render, payload in (
+        ("reviews before", reviews_before, reviews),
+        ("reviews after", orjson_after, projected_reviews),
+        ("directory before", directory_before, pairs),
+        ("directory after", orjson_after, projected_directory),
+    ):
+        cpu_ms, peak_kib = measure(render, payload, requests)
+        rows.append((name, f"{cpu_ms:.3f}", f"{peak_kib:.0f}"))
+    print_table(("100-row response", "CPU ms/request", "peak alloc KiB"), rows)
+    print(f"directory BSON from Mongo: {wire_before / 1024:.0f} KiB before, {wire_after / 1024:.0f} KiB after projection")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+    try:
+        main(args.requests)
+    finally:
+        server.client.close()
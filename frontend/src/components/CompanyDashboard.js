@@ -32,7 +32,9 @@ function CompanyDashboard() {
   const navigate = useNavigate();
   const [profile, setProfile] = useState(null);
   const [professionals, setProfessionals] = useState([]);
+  const [professionalCount, setProfessionalCount] = useState(0);
   const [myReviews, setMyReviews] = useState([]);
+  const [myReviewCount, setMyReviewCount] = useState(0);
   const [sentRequests, setSentRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -56,27 +58,26 @@ function CompanyDashboard() {
         headers: { Authorization: `Bearer ${token}` }
       };
 
-      // Fetch company profile
-      const profileRes = await axios.get(`${API}/users/me`, config);
-      setProfile(profileRes.data);
-
-      // Fetch all professionals
-      const professionalsRes = await axios.get(`${API}/professionals`);
-      setProfessionals(professionalsRes.data);
-
-      // Fetch reviews made by this company
-      const reviewsRes = await axios.get(`${API}/reviews`);
-      const companyReviews = reviewsRes.data.filter(
-        review => review.reviewer_user_id === user?.id
-      );
-      setMyReviews(companyReviews);
+      // Fetch profile, top professionals, reviews given and sent requests in one call
+      const dashboardRes = await axios.get(`${API}/dashboard/company`, config);
+      const dashboard = dashboardRes.data;
+      if (dashboard.unavailable.length > 0) {
+        console.log('Some dashboard data is unavailable:', dashboard.unavailable);
+      }
 
-      // Fetch sent service requests
-      try {
-        const requestsRes = await axios.get(`${API}/service-requests/sent`, config);
-        setSentRequests(requestsRes.data);
-      } catch (err) {
-        console.log('Could not fetch sent requests:', err);
+      if (dashboard.profile) {
+        setProfile(dashboard.profile);
+      }
+      if (dashboard.professionals) {
+        setProfessionals(dashboard.professionals.top);
+        setProfessionalCount(dashboard.professionals.count);
+      }
+      if (dashboard.reviews) {
+        setMyReviews(dashboard.reviews.recent);
+        setMyReviewCount(dashboard.reviews.count);
+      }
+      if (dashboard.service_requests) {
+        setSentRequests(dashboard.service_requests);
       }
       
     } catch (error) {
@@ -206,7 +207,7 @@ function CompanyDashboard() {
                   </div>
                   <div className="flex items-center text-gray-700">
                     <MessageSquare className="h-4 w-4 mr-2 text-gray-400" />
-                    <span className="text-sm">{myReviews.length} reseñas dadas</span>
+                    <span className="text-sm">{myReviewCount} reseñas dadas</span>
                   </div>
                 </div>
 
@@ -226,7 +227,7 @@ function CompanyDashboard() {
               <Users className="h-4 w-4" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{professionals.length}</div>
+              <div className="text-2xl font-bold">{professionalCount}</div>
               <p className="text-xs opacity-80">
                 En toda la plataforma
               </p>
@@ -239,7 +240,7 @@ function CompanyDashboard() {
               <Star className="h-4 w-4" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{myReviews.length}</div>
+              <div className="text-2xl font-bold">{myReviewCount}</div>
               <p className="text-xs opacity-80">
                 Profesionales calificados
               </p>
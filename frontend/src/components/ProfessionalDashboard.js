@@ -32,6 +32,7 @@ function ProfessionalDashboard() {
   const { user } = useAuth();
   const [profile, setProfile] = useState(null);
   const [reviews, setReviews] = useState([]);
+  const [reviewCount, setReviewCount] = useState(0);
   const [serviceRequests, setServiceRequests] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -57,25 +58,23 @@ function ProfessionalDashboard() {
         headers: { Authorization: `Bearer ${token}` }
       };
 
-      // Fetch professional profile
-      const profileRes = await axios.get(`${API}/users/me`, config);
-      setProfile(profileRes.data);
-      setNewAvailability(profileRes.data.availability_status || 'available');
-
-      // Fetch reviews for this professional
-      const reviewsRes = await axios.get(`${API}/reviews`);
-      const myReviews = reviewsRes.data.filter(
-        review => review.reviewed_user_id === user?.id
-      );
-      setReviews(myReviews);
+      // Fetch profile, received reviews and service requests in one call
+      const dashboardRes = await axios.get(`${API}/dashboard/professional`, config);
+      const dashboard = dashboardRes.data;
+      if (dashboard.unavailable.length > 0) {
+        console.log('Some dashboard data is unavailable:', dashboard.unavailable);
+      }
 
-      // Fetch service requests
-      try {
-        const serviceRequestsRes = await axios.get(`${API}/service-requests/received`, config);
-        setServiceRequests(serviceRequestsRes.data);
-      } catch (err) {
-        // Service requests might fail if user is not a professional, ignore
-        console.log('Could not fetch service requests:', err);
+      if (dashboard.profile) {
+        setProfile(dashboard.profile);
+        setNewAvailability(dashboard.profile.availability_status || 'available');
+      }
+      if (dashboard.reviews) {
+        setReviews(dashboard.reviews.recent);
+        setReviewCount(dashboard.reviews.count);
+      }
+      if (dashboard.service_requests) {
+        setServiceRequests(dashboard.service_requests);
       }
       
     } catch (error) {
@@ -394,7 +393,7 @@ function ProfessionalDashboard() {
               <MessageSquare className="h-4 w-4" />
             </CardHeader>
             <CardContent>
-              <div className="text-2xl font-bold">{reviews.length}</div>
+              <div className="text-2xl font-bold">{reviewCount}</div>
               <p className="text-xs opacity-80">
                 Reseñas recibidas
               </p>
@@ -0,0 +1,35 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The backend is a single module, not a package; tests import it as `server`
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=2000")
+os.environ.setdefault("DB_NAME", "iqx_test")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # Motor binds its client to the current loop on first use; provide one and run everything on it
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    return server.client.get_io_loop()
+
+
+@pytest.fixture(scope="session")
+def mongo(loop):
+    """A reachable, empty test database, dropped again after the session; skips otherwise"""
+    if "test" not in server.db.name:
+        pytest.skip(f"DB_NAME {server.db.name!r} does not look like a test database")
+    try:
+        loop.run_until_complete(server.client.admin.command("ping"))
+    except Exception as e:
+        pytest.skip(f"MongoDB unreachable: {e}")
+    loop.run_until_complete(server.client.drop_database(server.db.name))
+    loop.run_until_complete(server.ensure_indexes())
+    yield server.db
+    loop.run_until_complete(server.client.drop_database(server.db.name))
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+@pytest.mark.parametrize("proxies, forwarded_for, expected", [
+    (None, b"203.0.113.9", None),
+    (0, b"203.0.113.9", "10.0.0.2"),
+    (1, b"198.51.100.1, 203.0.113.9", "203.0.113.9"),
+    (2, b"198.51.100.1, 203.0.113.9, 10.0.0.7", "203.0.113.9"),
+    (3, b"203.0.113.9", "203.0.113.9"),
+])
+def test_client_ip_skips_only_trusted_proxy_hops(monkeypatch, proxies, forwarded_for, expected):
+    monkeypatch.setattr(server, "RATE_LIMIT_TRUSTED_PROXIES", proxies)
+    scope = {"client": ("10.0.0.2", 51234)}
+    assert server.client_ip(scope, {b"x-forwarded-for": forwarded_for}) == expected
+
+
+def test_open_streams_are_not_capped():
+    opened = []
+    release = asyncio.Event()
+
+    async def stream(scope, receive, send):
+        opened.append(scope["client"])
+        await release.wait()
+
+    async def open_streams(count):
+        middleware = server.AdmissionControlMiddleware(stream)
+        tasks = [
+            asyncio.create_task(middleware(
+                {"type": "http", "method": "GET", "path": "/api/events/stream", "headers": [],
+                 "client": (f"10.0.{i // 256}.{i % 256}", 50000)},
+                None, None
+            ))
+            for i in range(count)
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    # Well past any concurrency cap; each connection comes from its own address
+    asyncio.run(open_streams(3000))
+    assert len(opened) == 3000
+
+
+def test_unconfigured_proxy_does_not_share_one_bucket(monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_TRUSTED_PROXIES", None)
+    statuses = []
+
+    async def login(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def log_in(count):
+        middleware = server.AdmissionControlMiddleware(login)
+        for _ in range(count):
+            # Every request arrives from the ingress address
+            await middleware(
+                {"type": "http", "method": "POST", "path": "/api/auth/login", "headers": [], "client": ("10.0.0.2", 50000)},
+                None, send
+            )
+
+    asyncio.run(log_in(200))
+    assert statuses == [200] * 200
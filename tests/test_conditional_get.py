@@ -0,0 +1,84 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+
+class Tripwire:
+    """Stands in for the database: any access fails the test"""
+
+    def __getattr__(self, name):
+        raise AssertionError(f"database accessed: db.{name}")
+
+    def __getitem__(self, name):
+        raise AssertionError(f"database accessed: db[{name!r}]")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(server, "db", Tripwire())
+    monkeypatch.setattr(server, "collection_versions", {"users": 3, "professionals": 5, "reviews": 8})
+    monkeypatch.setitem(server.version_state, "epoch", "test")
+    # Not entered as a context manager, so startup (and its Mongo work) does not run
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("path, collections", [
+    ("/api/professionals", ("users", "professionals")),
+    ("/api/professionals?specialty=Ortopedia&limit=20", ("users", "professionals")),
+    ("/api/professionals/some-professional-id", ("users", "professionals")),
+    ("/api/reviews", ("reviews",)),
+    ("/api/reviews/summary/some-user-id", ("reviews",)),
+])
+def test_unchanged_poll_costs_zero_database_reads(client, path, collections):
+    etag = server.collection_etag(*collections)
+    response = client.get(path, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.content == b""
+    assert response.headers["Server-Timing"].startswith('db;dur=0.0;desc="0 queries')
+
+
+def test_specialties_poll_costs_zero_database_reads(client):
+    etag = client.get("/api/specialties").headers["ETag"]
+    response = client.get("/api/specialties", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_version_broadcast_from_another_worker_invalidates_etag(client):
+    etag = server.collection_etag("users", "professionals")
+    server.apply_collection_versions({"professionals": 6})
+    assert server.collection_etag("users", "professionals") != etag
+    # A late, older broadcast never moves the version back
+    server.apply_collection_versions({"professionals": 4})
+    assert server.collection_versions["professionals"] == 6
+
+
+def test_event_hub_routes_version_broadcasts(client, monkeypatch):
+    monkeypatch.setattr(server.event_hub, "handlers", {"collection.versions": server.apply_collection_versions})
+    server.event_hub.deliver({"user_ids": [], "type": "collection.versions", "data": {"reviews": 9}})
+    assert server.collection_versions["reviews"] == 9
+
+
+def test_review_from_another_worker_reaches_the_feed(client, monkeypatch):
+    monkeypatch.setattr(server, "recent_reviews", server.deque([{"id": "old", "rating": 4}], maxlen=3))
+    monkeypatch.setattr(server.event_hub, "handlers", {"review.created": server.add_recent_review})
+    review = {"id": "new", "rating": 5}
+    server.event_hub.deliver({"user_ids": [], "type": "review.created", "data": review})
+    # The writing worker added it already; its own event coming back must not duplicate it
+    server.event_hub.deliver({"user_ids": [], "type": "review.created", "data": review})
+    assert client.get("/api/reviews").json() == [review, {"id": "old", "rating": 4}]
+
+
+def test_profile_edit_on_another_worker_drops_the_cached_principal(client, monkeypatch):
+    cache = server.TTLCache(maxsize=10, ttl=60)
+    cache.set("pro@example.com", "old principal")
+    cache.set("other@example.com", "other principal")
+    monkeypatch.setattr(server, "principal_cache", cache)
+    monkeypatch.setattr(server.event_hub, "handlers", {"principal.invalidated": server.apply_principal_invalidation})
+    server.event_hub.deliver({"user_ids": [], "type": "principal.invalidated", "data": {"email": "pro@example.com"}})
+    assert cache.get("pro@example.com") is None
+    assert cache.get("other@example.com") == "other principal"
+    server.event_hub.deliver({"user_ids": [], "type": "principal.invalidated", "data": {"email": None}})
+    assert cache.get("other@example.com") is None
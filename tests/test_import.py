@@ -0,0 +1,19 @@
+import asyncio
+import json
+
+import server
+
+
+async def lines(*rows):
+    for row in rows:
+        yield json.dumps(row)
+
+
+def test_failed_row_report_does_not_echo_the_password():
+    # No experience_years, so the row fails validation before anything is written
+    row = {"password": "S3cretPassw0rd!", "email": "pro@example.com", "full_name": "Pro", "phone": "3000000000"}
+    report = asyncio.run(server.import_profiles(lines(row), "ndjson", "professional"))
+    assert report.failed == 1
+    error = report.dict()["errors"][0]
+    assert error == {"line": 1, "error": "experience_years: Field required"}
+    assert "S3cret" not in json.dumps(report.dict())
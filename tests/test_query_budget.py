@@ -0,0 +1,85 @@
+"""Query budgets for the directory and dashboard routes, enforced against a real MongoDB.
+
+Skipped when MONGO_URL is unreachable. The database named by DB_NAME (default iqx_test) is dropped
+before and after the test session, so never point it at real data.
+"""
+import re
+from datetime import timedelta
+
+import httpx
+import pytest
+
+import server
+
+PROFESSIONALS = 60  # more profiles than the default budget, so a per-profile query would fail
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries')
+
+
+async def seed() -> dict:
+    accounts = {}
+    for user_type, count in (("company", 1), ("professional", PROFESSIONALS)):
+        users, profiles = [], []
+        for i in range(count):
+            user, profile = server.build_account({
+                "email": f"{user_type}{i}@budget.example",
+                "user_type": user_type,
+                "full_name": f"{user_type.title()} {i}",
+                "phone": "3000000000",
+                "location": ["Bogotá", "Medellín"][i % 2],
+                "specialties": [["Ortopedia", "Columna"][i % 2]],
+                "company_name": f"Company {i}",
+                "company_type": "hospital",
+            })
+            users.append(user.dict())
+            profiles.append(profile.dict())
+        await server.db.users.insert_many(users)
+        await server.db[server.PROFILE_COLLECTIONS[user_type]].insert_many(profiles)
+        accounts[user_type] = users
+
+    company = accounts["company"][0]
+    for professional in accounts["professional"]:
+        await server.db.service_requests.insert_one(server.ServiceRequest(
+            professional_id=professional["id"], company_id=company["id"], company_name=company["full_name"],
+            company_email=company["email"], company_phone=company["phone"]
+        ).dict())
+        review = server.Review(
+            reviewed_user_id=professional["id"], reviewer_user_id=company["id"], reviewer_name=company["full_name"],
+            reviewer_type="company", rating=5, comment="Excelente trabajo"
+        ).dict()
+        await server.db.reviews.insert_one(review)
+        await server.record_review_summary(review)
+    await server.rebuild_professional_indexes()
+    return {"company": company["email"], "professional": accounts["professional"][0]["email"]}
+
+
+@pytest.fixture(scope="module")
+def accounts(mongo, loop):
+    return loop.run_until_complete(seed())
+
+
+@pytest.mark.parametrize("path, account", [
+    ("/api/professionals", None),
+    ("/api/professionals?specialty=Ortopedia", None),
+    ("/api/professionals?location=bogota", None),
+    ("/api/professionals?limit=20&near=4.65,-74.06", None),
+    ("/api/dashboard/company", "company"),
+    ("/api/dashboard/professional", "professional"),
+])
+def test_route_stays_within_query_budget(monkeypatch, loop, accounts, path, account):
+    monkeypatch.setattr(server, "QUERY_BUDGET_ENFORCED", True)
+    server.principal_cache._entries.clear()
+    headers = {}
+    if account:
+        token = server.create_access_token({"sub": accounts[account]}, timedelta(minutes=5))
+        headers["Authorization"] = f"Bearer {token}"
+
+    async def get():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    # Over budget, the accounting middleware raises before the response starts
+    response = loop.run_until_complete(get())
+    assert response.status_code == 200, response.text
+    commands = int(SERVER_TIMING_QUERIES.search(response.headers["server-timing"]).group(1))
+    assert 0 < commands <= server.QUERY_BUDGET
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def review(user_id: str, rating: int) -> dict:
+    return server.Review(
+        reviewed_user_id=user_id, reviewer_user_id="company", reviewer_name="Clínica Norte",
+        reviewer_type="company", rating=rating, comment="Muy puntual"
+    ).dict()
+
+
+def test_rebuild_keeps_summaries_updated_since_it_began(mongo, loop):
+    async def scenario():
+        await server.db.reviews.insert_many([review("stale", 4), review("stale", 2), review("live", 5)])
+        await server.db.review_summaries.insert_one({"user_id": "stale", "count": 7, "rating_sum": 30})
+        # A review recorded while the rebuild runs carries a later updated_at than the rebuild's start
+        live = {"user_id": "live", "count": 2, "rating_sum": 9, "updated_at": datetime.now(timezone.utc) + timedelta(minutes=1)}
+        await server.db.review_summaries.insert_one(dict(live))
+
+        await server.rebuild_review_summaries()
+
+        stale = await server.get_review_summary("stale")
+        assert (stale["count"], stale["rating_sum"], stale["average_rating"]) == (2, 6, 3.0)
+        assert len(stale["recent"]) == 2
+        kept = await server.db.review_summaries.find_one({"user_id": "live"}, {"_id": 0, "count": 1, "rating_sum": 1})
+        assert kept == {"count": 2, "rating_sum": 9}
+
+    loop.run_until_complete(scenario())
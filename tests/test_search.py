@@ -0,0 +1,59 @@
+import server
+
+
+def professional(user_id, **fields):
+    return {"user_id": user_id, "full_name": "", "location": "Bogotá", "specialties": [], **fields}
+
+
+def test_fold_text_ignores_case_and_accents():
+    assert server.fold_text("Traumatología") == "traumatologia"
+    assert server.fold_text("BOGOTÁ Ñuñoa") == "bogota nunoa"
+    assert server.tokenize("Cirugía de Columna, Ortopedia") == ["cirugia", "de", "columna", "ortopedia"]
+
+
+def test_search_matches_unaccented_query_and_prefixes():
+    index = server.SearchIndex()
+    index.update("trauma", professional("trauma", specialties=["Traumatología"]))
+    index.update("cardio", professional("cardio", specialties=["Cardiología"]))
+
+    assert [doc_id for doc_id, _ in index.search("traumatologia")] == ["trauma"]
+    assert [doc_id for doc_id, _ in index.search("TRAUMATOLOGÍA")] == ["trauma"]
+    assert [doc_id for doc_id, _ in index.search("trauma")] == ["trauma"]
+    assert [doc_id for doc_id, _ in index.search("cardi")] == ["cardio"]
+
+
+def test_exact_match_outranks_prefix_match():
+    index = server.SearchIndex()
+    index.update("exact", professional("exact", skills=["columna"]))
+    index.update("prefix", professional("prefix", skills=["columnas"]))
+    assert [doc_id for doc_id, _ in index.search("columna")] == ["exact", "prefix"]
+
+
+def test_update_replaces_and_remove_drops_a_document():
+    index = server.SearchIndex()
+    index.update("pro", professional("pro", specialties=["Ortopedia"]))
+    index.update("pro", professional("pro", specialties=["Neurología"]))
+    assert index.search("ortopedia") == []
+    assert [doc_id for doc_id, _ in index.search("neuro")] == ["pro"]
+    index.remove("pro")
+    assert index.search("neuro") == []
+    assert index.sorted_terms == []
+
+
+def test_directory_edit_on_another_worker_reaches_the_index(monkeypatch):
+    monkeypatch.setattr(server, "search_index", server.SearchIndex())
+    monkeypatch.setattr(server, "match_engine", server.MatchEngine())
+    monkeypatch.setattr(server.event_hub, "handlers", {"professionals.updated": server.apply_professional_updates})
+    edited = professional("pro", specialties=["Traumatología"], availability_status="available")
+    server.event_hub.deliver({"user_ids": [], "type": "professionals.updated", "data": {"professionals": [edited]}})
+    assert [doc_id for doc_id, _ in server.search_index.search("traumatologia")] == ["pro"]
+    assert server.match_engine.user_ids == ["pro"]
+
+
+def test_rating_applied_on_another_worker_reaches_the_match_engine(monkeypatch):
+    engine = server.MatchEngine()
+    engine.update("pro", professional("pro", average_rating=3.0))
+    monkeypatch.setattr(server, "match_engine", engine)
+    monkeypatch.setattr(server.event_hub, "handlers", {"professional.rated": server.apply_professional_rating})
+    server.event_hub.deliver({"user_ids": [], "type": "professional.rated", "data": {"user_id": "pro", "average_rating": 4.5}})
+    assert engine.rating[engine.rows["pro"]] == 4.5
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import httpx
+
+import server
+
+
+def test_release_precondition_excludes_disputed_payments():
+    assert server.status_precondition("payment", "released") == {"status": {"$in": ["completed"]}}
+    assert server.status_precondition("payment", "in_dispute") == {"status": {"$in": ["completed", "released"]}}
+
+
+def headers_for(user) -> dict:
+    token = server.create_access_token({"sub": user.email}, timedelta(minutes=5))
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def create_account(user_type: str, suffix: str):
+    user, profile = server.build_account({
+        "email": f"{user_type}-{suffix}@workflow.example",
+        "user_type": user_type,
+        "full_name": f"{user_type.title()} {suffix}",
+        "phone": "3000000000",
+        "location": "Bogotá",
+        "company_name": "Clínica Norte",
+        "company_type": "hospital",
+    })
+    await server.db.users.insert_one(user.dict())
+    await server.db[server.PROFILE_COLLECTIONS[user_type]].insert_one(profile.dict())
+    return user
+
+
+def test_company_confirmation_does_not_release_a_disputed_payment(mongo, loop):
+    async def scenario():
+        company = await create_account("company", "dispute")
+        professional = await create_account("professional", "dispute")
+        service_request = server.ServiceRequest(
+            professional_id=professional.id, company_id=company.id, company_name=company.full_name,
+            company_email=company.email, company_phone=company.phone, status="approved"
+        )
+        await server.db.service_requests.insert_one(service_request.dict())
+        await server.db.service_completions.insert_one(server.ServiceCompletion(
+            service_request_id=service_request.id, professional_id=professional.id, arrival_confirmed=True
+        ).dict())
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            paid = await client.post("/api/payments", headers=headers_for(company), json={
+                "service_request_id": service_request.id, "amount": 250000
+            })
+            assert paid.status_code == 200, paid.text
+            disputed = await client.post("/api/disputes", headers=headers_for(company), json={
+                "service_request_id": service_request.id, "reason": "no_show", "description": "No llegó"
+            })
+            assert disputed.status_code == 200, disputed.text
+            confirmed = await client.patch(
+                f"/api/service-completions/{service_request.id}/company-confirm",
+                headers=headers_for(company), json={"confirmed": True}
+            )
+        assert confirmed.status_code == 409, confirmed.text
+
+        payment = await server.db.payments.find_one({"service_request_id": service_request.id})
+        completion = await server.db.service_completions.find_one({"service_request_id": service_request.id})
+        events = await server.db.payment_ledger.distinct("event", {"payment_id": payment["id"]})
+        assert payment["status"] == "in_dispute"
+        assert completion["status"] == "pending"
+        assert sorted(events) == ["completed", "in_dispute"]
+
+    loop.run_until_complete(scenario())